@@ -0,0 +1,298 @@
+'''
+This file generates a synthetic CDM18 workload in the JSON line format of the DARPA TC
+engagement dumps, so ingest, graph construction and summarization can be benchmarked
+without the real data. The output files can be given directly to Reference/data_dumping.py
+(--files ...) and every stage downstream of it.
+
+The generated trace follows the shape of the CADETS data: a host, a few principals and a
+process fork tree where every new process executes a binary and maps a burst of shared
+libraries that are never written (the read-only files the summarizer merges), processes
+that read and write data files, and a few server processes that fan out over many sockets.
+Object counts scale with the number of events in roughly the CADETS ratios. The same seed
+always produces the same files.
+'''
+
+import os
+import gzip
+import json
+import uuid
+import random
+import argparse
+
+CDM_NAMESPACE = 'com.bbn.tc.schema.avro.cdm18.'
+UUID_TYPE = CDM_NAMESPACE + 'UUID'
+
+# Start of the CADETS trace and the first test day (nm_graph_construction.py), so the
+# default trace has both training and testing events.
+begin_time_nanos = 1522706861813350340
+default_duration_hours = 7 * 24
+
+library_paths = ['/lib', '/usr/lib', '/usr/local/lib', '/lib/casper']
+binary_paths = ['/bin', '/sbin', '/usr/bin', '/usr/sbin', '/usr/local/bin']
+data_paths = ['/tmp', '/var/log', '/var/run', '/home/admin', '/etc', '/usr/home/user/.cache']
+remote_networks = ['128.55.12.', '10.0.4.', '155.162.39.', '61.167.39.', '25.159.96.']
+
+
+class CDMWriter:
+    '''
+    Writes CDM18 records as JSON lines and starts a new file every lines_per_file lines,
+    named like the engagement dumps: <prefix>.json, <prefix>.json.1, <prefix>.json.2, ...
+    '''
+
+    def __init__(self, output_dir, prefix, lines_per_file, compress):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.lines_per_file = lines_per_file
+        self.compress = compress
+        self.file_names = []
+        self.record_counts = dict()
+        self.lines_in_file = 0
+        self.f = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def open_next(self):
+        if self.f is not None:
+            self.f.close()
+        name = self.prefix + '.json'
+        if len(self.file_names) > 0:
+            name += '.{}'.format(len(self.file_names))
+        if self.compress:
+            name += '.gz'
+        path = os.path.join(self.output_dir, name)
+        self.f = gzip.open(path, 'wt', encoding='utf-8') if self.compress else open(path, 'w', encoding='utf-8')
+        self.file_names.append(path)
+        self.lines_in_file = 0
+
+    def write(self, record_type, record):
+        if self.f is None or self.lines_in_file >= self.lines_per_file:
+            self.open_next()
+        self.f.write(json.dumps({"datum": {CDM_NAMESPACE + record_type: record}, "CDMVersion": "18", "source": "SOURCE_FREEBSD_DTRACE_CADETS"}, separators=(',', ':')))
+        self.f.write('\n')
+        self.lines_in_file += 1
+        self.record_counts[record_type] = self.record_counts.get(record_type, 0) + 1
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class WorkloadGenerator:
+
+    def __init__(self, writer, seed, num_events, num_subjects, num_files, num_libraries, num_netflows, num_servers, start_nanos, duration_nanos):
+        self.writer = writer
+        self.random = random.Random(seed)
+        self.num_events = num_events
+        self.num_subjects = num_subjects
+        self.num_files = num_files
+        self.num_libraries = num_libraries
+        self.num_netflows = num_netflows
+        self.num_servers = num_servers
+        self.time_stamp = start_nanos
+        self.mean_gap = max(duration_nanos // max(num_events, 1), 1)
+        self.sequence = 0
+        self.events = 0
+        self.next_cid = 1
+        self.host_id = None
+        self.principals = []
+        self.live_subjects = []
+        self.servers = []
+        self.subjects_created = 0
+        self.libraries = []
+        self.binaries = []
+        self.data_files = []
+        self.netflows = []
+
+    def new_uuid(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128))).upper()
+
+    def base_object(self):
+        return {"hostId": self.host_id, "permission": None, "epoch": None, "properties": {"map": {}}}
+
+    def emit_host(self):
+        self.host_id = self.new_uuid()
+        self.writer.write('Host', {
+            "uuid": self.host_id, "hostName": "synthetic-cadets", "hostIdentifiers": [],
+            "osDetails": "FreeBSD 11.0-STABLE FreeBSD 11.0-STABLE #1 amd64", "hostType": "HOST_DESKTOP",
+            "interfaces": []})
+
+    def emit_principals(self, count = 4):
+        for user_id in range(count):
+            principal = self.new_uuid()
+            self.principals.append(principal)
+            self.writer.write('Principal', {
+                "uuid": principal, "type": "PRINCIPAL_LOCAL", "hostId": self.host_id,
+                "userId": str(user_id if user_id == 0 else 1000 + user_id), "username": None,
+                "groupIds": [str(user_id)], "properties": {"map": {}}})
+
+    def emit_file(self, path):
+        file_uuid = self.new_uuid()
+        self.writer.write('FileObject', {
+            "uuid": file_uuid, "baseObject": self.base_object(), "type": "FILE_OBJECT_FILE",
+            "fileDescriptor": None, "localPrincipal": None, "size": None, "peInfo": None, "hashes": None})
+        return file_uuid, path
+
+    def emit_subject(self, parent):
+        subject = self.new_uuid()
+        cid = self.next_cid
+        self.next_cid += 1
+        binary = self.random.choice(self.binaries)
+        self.writer.write('Subject', {
+            "uuid": subject, "type": "SUBJECT_PROCESS", "cid": cid,
+            "parentSubject": {UUID_TYPE: parent[0]} if parent is not None else None,
+            "hostId": self.host_id, "localPrincipal": self.random.choice(self.principals),
+            "startTimestampNanos": self.time_stamp, "unitId": None, "iteration": None, "count": None,
+            "cmdLine": {"string": binary[1].rsplit('/', 1)[1]}, "privilegeLevel": None,
+            "importedLibraries": None, "exportedLibraries": None,
+            "properties": {"map": {"host": self.host_id}}})
+        self.subjects_created += 1
+        return (subject, cid)
+
+    def emit_netflow(self):
+        netflow = self.new_uuid()
+        self.writer.write('NetFlowObject', {
+            "uuid": netflow, "baseObject": self.base_object(),
+            "localAddress": self.random.choice(['128.55.12.73', 'localhost', '::1']), "localPort": self.random.randint(1024, 65535),
+            "remoteAddress": self.random.choice(remote_networks) + str(self.random.randint(1, 254)),
+            "remotePort": self.random.choice([22, 53, 80, 443, 8080, self.random.randint(1024, 65535)]),
+            "ipProtocol": {"int": 6}, "fileDescriptor": None})
+        return netflow
+
+    def emit_event(self, event_type, subject, predicate_object = None, predicate_object_path = None, predicate_object_2 = None, predicate_object_2_path = None, size = None):
+        # Timestamps advance by exponentially distributed gaps around the mean event spacing.
+        self.time_stamp += int(self.random.expovariate(1.0) * self.mean_gap) + 1
+        self.sequence += 1
+        self.events += 1
+        self.writer.write('Event', {
+            "uuid": self.new_uuid(), "sequence": {"long": self.sequence}, "type": event_type,
+            "threadId": {"int": 100000 + subject[1]}, "hostId": self.host_id,
+            "subject": {UUID_TYPE: subject[0]},
+            "predicateObject": {UUID_TYPE: predicate_object} if predicate_object is not None else None,
+            "predicateObjectPath": {"string": predicate_object_path} if predicate_object_path is not None else None,
+            "predicateObject2": {UUID_TYPE: predicate_object_2} if predicate_object_2 is not None else None,
+            "predicateObject2Path": {"string": predicate_object_2_path} if predicate_object_2_path is not None else None,
+            "timestampNanos": self.time_stamp, "name": {"string": 'aue_' + event_type[len('EVENT_'):].lower()},
+            "parameters": None, "location": None, "size": {"long": size} if size is not None else None,
+            "programPoint": None, "properties": {"map": {}}})
+
+    def behind(self, created, target):
+        # True while fewer objects exist than the share of the target the event progress calls for.
+        return created < target * (self.events + 1) / self.num_events
+
+    def setup(self):
+        self.emit_host()
+        self.emit_principals()
+        for idx in range(self.num_libraries):
+            self.libraries.append(self.emit_file('{}/lib{}.so.{}'.format(self.random.choice(library_paths), idx, self.random.randint(1, 9))))
+        for idx in range(max(self.num_libraries // 4, 1)):
+            self.binaries.append(self.emit_file('{}/bin{}'.format(self.random.choice(binary_paths), idx)))
+        init = self.emit_subject(None)
+        self.live_subjects.append(init)
+
+    def fork(self):
+        # Recent processes fork more often, which grows deep chains as well as wide shells.
+        parent = self.live_subjects[-1 - min(int(self.random.expovariate(0.2)), len(self.live_subjects) - 1)]
+        child = self.emit_subject(parent)
+        self.emit_event('EVENT_FORK', parent, child[0])
+        binary = self.random.choice(self.binaries)
+        self.emit_event('EVENT_EXECUTE', child, binary[0], binary[1])
+        # Library burst: every exec maps a set of shared libraries that nobody writes.
+        for library in self.random.sample(self.libraries, min(self.random.randint(5, 15), len(self.libraries))):
+            self.emit_event('EVENT_OPEN', child, library[0], library[1])
+            self.emit_event('EVENT_MMAP', child, library[0], library[1])
+            self.emit_event('EVENT_CLOSE', child, library[0], library[1])
+        self.live_subjects.append(child)
+        if len(self.servers) < self.num_servers and self.random.random() < 0.05:
+            self.servers.append(child)
+
+    def file_io(self):
+        subject = self.random.choice(self.live_subjects)
+        if len(self.data_files) == 0 or self.behind(len(self.data_files) + len(self.libraries) + len(self.binaries), self.num_files):
+            data_file = self.emit_file('{}/file{}.dat'.format(self.random.choice(data_paths), len(self.data_files)))
+            self.data_files.append(data_file)
+        else:
+            data_file = self.random.choice(self.data_files)
+        self.emit_event('EVENT_OPEN', subject, data_file[0], data_file[1])
+        # About a third of the data files are written, the rest stay read only.
+        event_type = 'EVENT_WRITE' if int(data_file[0][:8], 16) % 3 == 0 else 'EVENT_READ'
+        for _ in range(self.random.randint(1, 6)):
+            self.emit_event(event_type, subject, data_file[0], data_file[1], size=self.random.randint(1, 65536))
+        self.emit_event('EVENT_CLOSE', subject, data_file[0], data_file[1])
+
+    def network(self):
+        # Socket fan-out: most of the traffic goes through a handful of server processes.
+        if len(self.servers) > 0 and self.random.random() < 0.8:
+            subject = self.random.choice(self.servers)
+        else:
+            subject = self.random.choice(self.live_subjects)
+        if len(self.netflows) == 0 or self.behind(len(self.netflows), self.num_netflows):
+            netflow = self.emit_netflow()
+            self.netflows.append(netflow)
+            self.emit_event('EVENT_ACCEPT' if subject in self.servers else 'EVENT_CONNECT', subject, netflow)
+        else:
+            netflow = self.random.choice(self.netflows)
+        for _ in range(self.random.randint(1, 4)):
+            self.emit_event(self.random.choice(['EVENT_RECVFROM', 'EVENT_SENDTO']), subject, netflow, size=self.random.randint(1, 1500))
+
+    def exit(self):
+        if len(self.live_subjects) <= 1:
+            return
+        subject = self.live_subjects.pop(self.random.randrange(1, len(self.live_subjects)))
+        if subject in self.servers:
+            self.servers.remove(subject)
+        self.emit_event('EVENT_EXIT', subject)
+
+    def run(self):
+        self.setup()
+        next_report = 1000000
+        while self.events < self.num_events:
+            if self.behind(self.subjects_created, self.num_subjects):
+                self.fork()
+                continue
+            action = self.random.random()
+            if action < 0.70:
+                self.file_io()
+            elif action < 0.95:
+                self.network()
+            elif len(self.live_subjects) > self.num_servers + 16:
+                self.exit()
+            else:
+                self.fork()
+            if self.events >= next_report:
+                print("Generated {} events".format(self.events))
+                next_report += 1000000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='generate-cdm', description="Synthetic CDM18 JSON line workload for benchmarks")
+    parser.add_argument('-o', '--output-dir', required=True)
+    parser.add_argument('-n', '--events', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=538)
+    # Defaults follow the object/event ratios of the CADETS engagement data.
+    parser.add_argument('--subjects', type=int, help='Number of processes, default events/250.')
+    parser.add_argument('--files', type=int, help='Number of files, default events/16.')
+    parser.add_argument('--libraries', type=int, default=200)
+    parser.add_argument('--netflows', type=int, help='Number of sockets, default events/250.')
+    parser.add_argument('--servers', type=int, default=8, help='Processes that receive most of the network traffic.')
+    parser.add_argument('--start-nanos', type=int, default=begin_time_nanos)
+    parser.add_argument('--duration-hours', type=float, default=default_duration_hours)
+    parser.add_argument('--lines-per-file', type=int, default=5000000)
+    parser.add_argument('--prefix', default='ta1-synthetic-e3')
+    parser.add_argument('--gzip', action='store_true', help='Write gzip compressed files.')
+    args = parser.parse_args()
+
+    writer = CDMWriter(args.output_dir, args.prefix, args.lines_per_file, args.gzip)
+    generator = WorkloadGenerator(writer, args.seed, args.events,
+                                  args.subjects if args.subjects is not None else max(args.events // 250, 2),
+                                  args.files if args.files is not None else max(args.events // 16, 1),
+                                  args.libraries,
+                                  args.netflows if args.netflows is not None else max(args.events // 250, 1),
+                                  args.servers, args.start_nanos, int(args.duration_hours * 3600 * 1000000000))
+    generator.run()
+    writer.close()
+
+    for record_type in sorted(writer.record_counts):
+        print("{}: {}".format(record_type, writer.record_counts[record_type]))
+    print("Files:")
+    for file_name in writer.file_names:
+        print(file_name)
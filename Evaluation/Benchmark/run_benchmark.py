@@ -0,0 +1,211 @@
+'''
+This file runs the pipeline stages listed in a benchmark config (see synthetic_benchmark.json)
+one after another as subprocesses and records, for every stage, the wall time, the CPU time,
+the peak RSS and the throughput in items (events, records, edges) per second. The results are
+written to a JSON file and compared against a stored baseline, so a slower stage shows up as a
+regression instead of going unnoticed.
+
+A stage can also name phases: lines its output prints when a step inside the process finishes
+(e.g. "Pruned Graph Loaded." in summarize.py). The time up to each phase line is recorded
+separately, which splits summarize.py into pruning, template learning and summarization.
+'''
+
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import platform
+import argparse
+import subprocess
+from datetime import datetime as dt
+
+repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Relative change beyond which a metric is reported as a regression.
+default_tolerance = 0.10
+
+# metric name -> True if larger is better
+compared_metrics = {
+    "wall_seconds": False,
+    "items_per_second": True,
+    "peak_rss_mb": False
+}
+
+
+def max_rss_to_mb(max_rss):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    if sys.platform == 'darwin':
+        return max_rss / (1024 * 1024)
+    return max_rss / 1024
+
+
+def count_items(stage, log_lines, dataset):
+    '''
+    Number of items a stage processed: a fixed number, the dataset's event count ("events"),
+    or the sum of the first group of items_pattern over the stage output.
+    '''
+    items = stage.get("items")
+    if isinstance(items, int):
+        return items
+    if items == "events":
+        return dataset.get("events")
+    if "items_pattern" in stage:
+        pattern = re.compile(stage["items_pattern"])
+        total = 0
+        for line in log_lines:
+            for match in pattern.finditer(line):
+                total += int(match.group(1))
+        return total
+    return None
+
+
+def run_stage(stage, dataset, log_dir):
+    command = stage["command"]
+    if isinstance(command, str):
+        # A string is run through the shell, so it can use globs and pipes.
+        popen_args = {"args": command, "shell": True}
+    else:
+        popen_args = {"args": command}
+    cwd = os.path.join(repo_root, stage.get("cwd", '.'))
+    env = dict(os.environ)
+    # Unbuffered output, so phase lines are seen when they are printed.
+    env["PYTHONUNBUFFERED"] = "1"
+    env.update(stage.get("env", {}))
+
+    phase_markers = stage.get("phases", {})
+    phases = dict()
+    log_lines = []
+    log_path = os.path.join(log_dir, stage["name"] + '.log')
+    print("Running stage {}: {}".format(stage["name"], command if isinstance(command, str) else ' '.join([shlex.quote(c) for c in command])))
+
+    start_time = time.perf_counter()
+    last_phase_time = start_time
+    with open(log_path, 'w') as log_file:
+        process = subprocess.Popen(cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, **popen_args)
+        for line in process.stdout:
+            now = time.perf_counter()
+            log_file.write(line)
+            log_lines.append(line)
+            for phase_name, marker in phase_markers.items():
+                if phase_name not in phases and marker in line:
+                    phases[phase_name] = now - last_phase_time
+                    last_phase_time = now
+        process.stdout.close()
+        # wait4 reaps the process and returns its resource usage, which Popen.wait does not.
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall_seconds = time.perf_counter() - start_time
+
+    items = count_items(stage, log_lines, dataset)
+    result = {
+        "name": stage["name"],
+        "command": command,
+        "returncode": process.returncode,
+        "wall_seconds": wall_seconds,
+        "user_seconds": rusage.ru_utime,
+        "system_seconds": rusage.ru_stime,
+        # Largest resident set of the stage process and of the children it waited for (pool workers).
+        "peak_rss_mb": max_rss_to_mb(rusage.ru_maxrss),
+        "items": items,
+        "items_per_second": items / wall_seconds if items is not None and wall_seconds > 0 else None,
+        "phases": phases,
+        "log": log_path
+    }
+    print("Stage {} finished with code {} in {:.2f} seconds, peak RSS {:.1f} MB{}".format(
+        stage["name"], process.returncode, wall_seconds, result["peak_rss_mb"],
+        ", {:.0f} items/s".format(result["items_per_second"]) if result["items_per_second"] is not None else ''))
+    return result
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    '''
+    Prints the change of every compared metric against the baseline and returns the
+    list of (stage, metric, baseline value, current value) that got worse than tolerance.
+    '''
+    regressions = []
+    baseline_stages = {stage["name"]: stage for stage in baseline["stages"]}
+    print("{:<24} {:<18} {:>14} {:>14} {:>9}".format("stage", "metric", "baseline", "current", "change"))
+    for stage in results["stages"]:
+        if stage["name"] not in baseline_stages:
+            print("{:<24} not in baseline".format(stage["name"]))
+            continue
+        baseline_stage = baseline_stages[stage["name"]]
+        metrics = [(metric, higher_is_better) for metric, higher_is_better in compared_metrics.items()]
+        metrics += [("phase:" + phase, False) for phase in stage["phases"]]
+        for metric, higher_is_better in metrics:
+            if metric.startswith("phase:"):
+                current = stage["phases"].get(metric[len("phase:"):])
+                previous = baseline_stage.get("phases", {}).get(metric[len("phase:"):])
+            else:
+                current = stage.get(metric)
+                previous = baseline_stage.get(metric)
+            if current is None or previous is None or previous == 0:
+                continue
+            change = (current - previous) / previous
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = ' REGRESSION'
+                regressions.append((stage["name"], metric, previous, current))
+            print("{:<24} {:<18} {:>14.2f} {:>14.2f} {:>+8.1%}{}".format(stage["name"], metric, previous, current, change, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='run-benchmark', description="Per-stage benchmark of the ingest, graph and summarization pipeline")
+    parser.add_argument('config_file', help='Json file with the dataset description and the list of stages.')
+    parser.add_argument('-o', '--output', help='Results file, default benchmark_results_<timestamp>.json next to the config.')
+    parser.add_argument('--stages', nargs='+', help='Run only these stages, in config order.')
+    parser.add_argument('-b', '--baseline', help='Results file of an earlier run to compare against.')
+    parser.add_argument('--tolerance', type=float, default=default_tolerance)
+    parser.add_argument('--save-baseline', help='Also write the results to this file, to be used as the next baseline.')
+    parser.add_argument('--keep-going', action='store_true', help='Continue with the next stage after a failed one.')
+    args = parser.parse_args()
+
+    config = json.load(open(args.config_file, 'r'))
+    dataset = config.get("dataset", {})
+    started = dt.now()
+    output = args.output
+    if output is None:
+        output = os.path.join(os.path.dirname(os.path.abspath(args.config_file)), 'benchmark_results_{}.json'.format(started.strftime('%Y%m%d_%H%M%S')))
+    log_dir = os.path.splitext(output)[0] + '_logs'
+    os.makedirs(log_dir, exist_ok=True)
+
+    results = {
+        "config": os.path.abspath(args.config_file),
+        "started": str(started),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "dataset": dataset,
+        "stages": []
+    }
+    failed = False
+    for stage in config["stages"]:
+        if args.stages is not None and stage["name"] not in args.stages:
+            continue
+        result = run_stage(stage, dataset, log_dir)
+        results["stages"].append(result)
+        if result["returncode"] != 0:
+            failed = True
+            print("Stage {} failed, see {}".format(stage["name"], result["log"]))
+            if not args.keep_going:
+                break
+
+    json.dump(results, open(output, 'w'), indent=4)
+    print("Results written to {}".format(output))
+    if args.save_baseline is not None:
+        json.dump(results, open(args.save_baseline, 'w'), indent=4)
+        print("Baseline written to {}".format(args.save_baseline))
+
+    regressions = []
+    if args.baseline is not None:
+        regressions = compare_with_baseline(results, json.load(open(args.baseline, 'r')), args.tolerance)
+        print("{} regressions against {}".format(len(regressions), args.baseline))
+
+    if failed:
+        exit(2)
+    if len(regressions) > 0:
+        exit(1)
@@ -2,8 +2,11 @@ from tqdm import tqdm
 import networkx as nx
 import json
 import os
+import sys
 import hashlib
 import base64
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Nodemerge'))
+import node_index as ni
 
 mapping_dict = {
     "Host": 2,
@@ -35,9 +38,10 @@ with open("/home/cpsc538p/Documents/SummDetector/Nodemerge/uuid_exec_maps.json",
     uuid_exec_maps = json.load(f)
     f.close()
 
-with open("/home/cpsc538p/Documents/SummDetector/Nodemerge/index_file.json", 'r') as f:
-    index_uuid_maps = json.load(f)
-    f.close()
+index_uuid_maps = ni.load_index("/home/cpsc538p/Documents/SummDetector/Nodemerge/index_file.idx")
+if ni.is_binary_index(index_uuid_maps):
+    # Node id -> uuid, as the id entries of index_file.json
+    index_uuid_maps = index_uuid_maps.uuid_view()
 
 
 
@@ -65,6 +69,8 @@ train_graph_1_path = "/scratch/cadet_graphs_attr/Training_Graphs/graph_1.edgelis
 train_graph_2_path = "/scratch/cadet_graphs_attr/Training_Graphs/graph_2.edgelist"
 
 
+# Read with networkx rather than ProvenanceGraph: the undirected read and compose_all below are
+# part of what the Unicorn input is built from, see Nodemerge/provenance_graph.py.
 train_graph_0 = nx.MultiDiGraph(nx.read_edgelist(train_graph_0_path))
 train_graph_1 = nx.MultiDiGraph(nx.read_edgelist(train_graph_1_path))
 train_graph_2 = nx.MultiDiGraph(nx.read_edgelist(train_graph_2_path))
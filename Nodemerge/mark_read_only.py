@@ -4,7 +4,110 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy import func
 from sqlalchemy import select
 import pg8000
+import os
 import json
+import node_index as ni
+import readonly_bitmap as rb
+
+# With incremental set, only the rows appended after the watermarks (the largest "Event" and
+# "FileObject" ids an earlier run covered) are looked at, so the readonly column keeps up with
+# streamed data without rescanning the whole tables: write events after the event watermark flip
+# their files, and file rows after the file watermark are checked against all write events, for
+# files whose writes were ingested before them. Every run, full or incremental, stores its watermarks.
+incremental = False
+watermark_file_location = 'readonly_watermark.json'
+# Serial ids are handed out before commit, so rows below a watermark can still appear after it was
+# taken (the parallel ingest keeps batches open across workers). Incremental runs start this many ids
+# below each watermark, rows that were handled before are skipped by readonly IS DISTINCT FROM 0.
+rescan_window = 1000000
+
+# Bitmap from nm_graph_construction.py to keep in step with the column, None to leave it alone.
+# The index it was built from gives the node ids of the newly written files, by uuid.
+readonly_bitmap_location = None
+index_file_location = 'index_file.idx'
+
+# The written files are computed on the server: a partial index holds the objects of the
+# EVENT_WRITE events, so the distinct projection is an index-only scan, and the uuid index on
+# "FileObject" serves the join. The second object gets its own partial index for the lookups of
+# new file rows. All are created once and reused by later runs.
+create_index_queries = [
+    'CREATE INDEX IF NOT EXISTS \"Event_write_objects_idx\" ON \"Event\" (predicate_object, predicate_object_2) WHERE type = \'EVENT_WRITE\';',
+    'CREATE INDEX IF NOT EXISTS \"Event_write_objects_2_idx\" ON \"Event\" (predicate_object_2) WHERE type = \'EVENT_WRITE\';',
+    'CREATE INDEX IF NOT EXISTS \"FileObject_uuid_idx\" ON \"FileObject\" (uuid);'
+]
+
+# Event id bounds are filled in per run: (watermark - rescan_window, MAX(id)] of "Event".
+written_files_query = '''
+    SELECT predicate_object AS uuid FROM "Event" WHERE type = 'EVENT_WRITE' AND predicate_object IS NOT NULL AND id > {0} AND id <= {1}
+    UNION
+    SELECT predicate_object_2 AS uuid FROM "Event" WHERE type = 'EVENT_WRITE' AND predicate_object_2 IS NOT NULL AND id > {0} AND id <= {1}
+'''
+
+# Rows that already hold 0 are not rewritten, so only files written for the first time come back.
+update_query = '''
+    UPDATE "FileObject" SET readonly = 0
+    FROM ({}) AS written
+    WHERE "FileObject".uuid = written.uuid AND "FileObject".readonly IS DISTINCT FROM 0
+    RETURNING "FileObject".uuid;
+'''
+
+# File rows with id bounds (file watermark, MAX(id)] that any write event names.
+new_files_update_query = '''
+    UPDATE "FileObject" SET readonly = 0
+    WHERE id > {} AND id <= {} AND readonly IS DISTINCT FROM 0
+      AND (EXISTS (SELECT 1 FROM "Event" WHERE type = 'EVENT_WRITE' AND predicate_object = "FileObject".uuid)
+           OR EXISTS (SELECT 1 FROM "Event" WHERE type = 'EVENT_WRITE' AND predicate_object_2 = "FileObject".uuid))
+    RETURNING uuid;
+'''
+
+candidate_count_query = 'SELECT COUNT(*) FROM \"Event\" WHERE type = \'EVENT_WRITE\' AND id > {} AND id <= {};'
+
+
+def load_watermark():
+    # {"event_id": ..., "file_id": ...}, None before the first run.
+    if not os.path.exists(watermark_file_location):
+        return None
+    with open(watermark_file_location, 'r') as f:
+        return json.load(f)
+
+
+def save_watermark(event_id, file_id):
+    with open(watermark_file_location + '.tmp', 'w') as f:
+        json.dump({"event_id": event_id, "file_id": file_id}, f)
+    os.replace(watermark_file_location + '.tmp', watermark_file_location)
+
+
+def update_readonly_bitmap(file_uuids):
+    '''
+    Sets the bits of the newly written files. Node ids are looked up by uuid, so a file row that
+    repeats a uuid gets the id the index kept for it, as in nm_graph_construction.py. Refuses a
+    bitmap that was built from a different index.
+    '''
+    index = ni.load_index(index_file_location)
+    if os.path.exists(readonly_bitmap_location):
+        bitmap = rb.ReadOnlyBitmap.load(readonly_bitmap_location)
+        if bitmap.index_identity != rb.get_index_identity(index):
+            if ni.is_binary_index(index):
+                index.close()
+            print("{} was built from a different index than {}, bitmap not updated".format(readonly_bitmap_location, index_file_location))
+            return False
+    else:
+        bitmap = rb.ReadOnlyBitmap.for_index(index)
+    missing_count = 0
+    for file_uuid in file_uuids:
+        entry = index.get(file_uuid)
+        if entry is None:
+            missing_count += 1
+            continue
+        bitmap.mark_written(entry[1])
+    if ni.is_binary_index(index):
+        index.close()
+    bitmap.save(readonly_bitmap_location)
+    if missing_count > 0:
+        print("{} written files are not in the index yet, graph construction sets their bits once it is updated".format(missing_count))
+    print("Read-only bitmap updated: {} written files".format(bitmap.written_count()))
+    return True
+
 
 def findReadOnlyFiles():
     # Set up the connection
@@ -13,40 +116,43 @@ def findReadOnlyFiles():
     Session = sessionmaker(bind=engine)
     session = Session()
 
-    # number_of_events = session.query(func.count(orm.Event.id)).scalar()
-    # number_of_subjects = session.query(func.count(orm.Subject.id)).scalar()
-    # number_of_files = session.query(func.count(orm.FileObject.id)).scalar()
-    # print(number_of_events, number_of_subjects, number_of_files)
-    skeleton_update_query = 'UPDATE \"FileObject\" set readonly=0 WHERE uuid = \'{}\';'
-    result = session.execute('SELECT * FROM \"Event\" WHERE type = \'EVENT_WRITE\' ')
-    batch_size = 10000
-    count = 1
-    batch_count = 0
-    loaded_result = result.fetchall()
-    print("Number of candidate_rows: {}".format(len(loaded_result)))
-    final_execute_query = ''
-    for result in loaded_result:
-        predicate_object1 = result.predicate_object
-        predicate_object2 = result.predicate_object_2
-        
-        if count%batch_size == 0:
-            session.execute(final_execute_query)
-            session.commit()
-            batch_count += 1
-            print("Update complete for a batch: {}.".format(batch_count))
-            final_execute_query = ''
-        else:
-            if predicate_object1 is not None:
-                final_execute_query += skeleton_update_query.format(predicate_object1)
-            if predicate_object2 is not None:   
-                final_execute_query += skeleton_update_query.format(predicate_object2)
-            count +=1 
-
-    session.execute(final_execute_query)
+    for create_index_query in create_index_queries:
+        session.execute(create_index_query)
+    session.commit()
+    print("Indexes ready.")
+
+    # Rows ingested while this runs are left to the next run.
+    end_event_id = session.execute('SELECT MAX(id) FROM \"Event\";').scalar() or 0
+    end_file_id = session.execute('SELECT MAX(id) FROM \"FileObject\";').scalar() or 0
+    watermark = load_watermark() if incremental else None
+    if incremental and watermark is None:
+        print("No watermark at {}, running over all events.".format(watermark_file_location))
+
+    if watermark is None:
+        # A full pass over all write events reaches every file row there is.
+        start_event_id = 0
+        start_file_id = end_file_id
+    else:
+        start_event_id = max(watermark["event_id"] - rescan_window, 0)
+        # Watermarks from before the file watermark was kept check every file row once.
+        start_file_id = max(watermark.get("file_id", 0) - rescan_window, 0)
+    print("Events {} to {}, new files {} to {}".format(start_event_id + 1, end_event_id, start_file_id + 1, end_file_id))
+
+    candidate_count = session.execute(candidate_count_query.format(start_event_id, end_event_id)).scalar()
+    print("Number of candidate_rows: {}".format(candidate_count))
+
+    result = session.execute(update_query.format(written_files_query.format(start_event_id, end_event_id)))
+    file_uuids = [row[0] for row in result.fetchall()]
+    if end_file_id > start_file_id:
+        result = session.execute(new_files_update_query.format(start_file_id, end_file_id))
+        file_uuids += [row[0] for row in result.fetchall()]
+    # The bitmap goes first: if the commit fails the next run flips the same files and sets their bits again.
+    if readonly_bitmap_location is not None and len(file_uuids) > 0:
+        update_readonly_bitmap(file_uuids)
     session.commit()
-    batch_count += 1
-    print("Update complete for final batch: {}.".format(batch_count))
+    save_watermark(end_event_id, end_file_id)
+    print("Update complete: {} files marked as written.".format(len(file_uuids)))
 
     session.close()
 
-findReadOnlyFiles()
\ No newline at end of file
+findReadOnlyFiles()
@@ -0,0 +1,848 @@
+'''
+This file contains the binary UUID <-> node id index that replaces index_file.json.
+The file is opened with mmap and never parsed as a whole, so opening it is instant and
+processes that open the same file share its pages through the page cache.
+
+Layout (little endian, every section starts on an 8 byte boundary):
+    header      magic, entry count, reverse base, reverse count, metadata length
+    metadata    JSON (type code -> table name, how UUIDs are printed, ...)
+    fanout      65537 int64, fanout[p] = number of keys whose first two bytes are < p
+    keys        entry count 16 byte UUIDs, sorted
+    ids         entry count int64 node ids, in key order
+    types       entry count int8 type codes, in key order
+    reverse     reverse count 16 byte UUIDs, slot i belongs to node id reverse base + i
+    rtypes      reverse count int8 type codes, 0 marks an unused slot
+
+A UUID lookup bisects only the keys of its fanout bucket, an id lookup is one array access.
+Worker processes get the index through an IndexHandle, either as the file (mmap) or as a
+shared memory block one parent filled, and read it in place.
+'''
+
+import os
+import sys
+import json
+import mmap
+import array
+import heapq
+import shutil
+import struct
+import bisect
+import tempfile
+import uuid as uuid_lib
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INDEX_MAGIC = b'NMIDX001'
+HEADER_FORMAT = '<8sqqqq'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+FANOUT_SIZE = 65537
+KEY_SIZE = 16
+# Maps the type code of a reverse slot to 1 for a used slot, 0 for an unused one.
+USED_SLOT_TABLE = bytes([0] + [1] * 255)
+
+table_types = {
+    "Host": 2,
+    "Principal": 3,
+    "Subject": 4,
+    "FileObject": 5,
+    "UnnamedPipeObject": 6,
+    "NetflowObject": 8,
+    "SrcSinkObject": 9,
+    "RegistryKeyObject": 12
+}
+
+
+# Type codes of the summary nodes summarize.py creates, they get id ranges after the tables.
+template_types = {
+    "FILE": 13,
+    "SOCKET": 14
+}
+
+# Ids reserved for each template type unless the index build asks for something else.
+default_template_capacity = 1000000
+
+# Template ids that were hard coded before the index carried its ranges, used with JSON indices.
+legacy_template_ids = {
+    "FILE": 4053445,
+    "SOCKET": 50534450
+}
+
+
+def check_byte_order():
+    # The arrays are mapped as native int64/int8, the format is defined as little endian.
+    if sys.byteorder != 'little':
+        raise RuntimeError("The binary node index is only supported on little endian machines")
+
+
+def align(n):
+    return (n + 7) & ~7
+
+
+def uuid_to_bytes(uuid_string):
+    key = bytes.fromhex(uuid_string.replace('-', ''))
+    if len(key) != KEY_SIZE:
+        raise ValueError("Not a UUID: {}".format(uuid_string))
+    return key
+
+
+def bytes_to_uuid(key, upper = True):
+    uuid_string = str(uuid_lib.UUID(bytes=bytes(key)))
+    return uuid_string.upper() if upper else uuid_string
+
+
+def is_node_index(index_file_location):
+    with open(index_file_location, 'rb') as f:
+        return f.read(len(INDEX_MAGIC)) == INDEX_MAGIC
+
+
+# Sort records of the external sort: big endian, so comparing the packed bytes orders
+# them by (uuid, arrival order) and the first occurrence of a duplicate UUID comes first.
+RUN_RECORD = struct.Struct('>16sQbq')
+# Rough size of one buffered record in memory, used to turn the memory budget into a run length.
+RUN_RECORD_MEMORY = 90
+COPY_BLOCK = 4 * 1024 * 1024
+
+
+def read_run(run_location):
+    with open(run_location, 'rb') as f:
+        while True:
+            block = f.read(RUN_RECORD.size * 32768)
+            if not block:
+                return
+            for start in range(0, len(block), RUN_RECORD.size):
+                yield block[start:start+RUN_RECORD.size]
+
+
+class NodeIndexWriter:
+    '''
+    Builds a binary node index from a stream of (uuid, type code, node id) entries with bounded
+    memory: entries are buffered up to the memory budget, sorted and spilled to run files, and
+    the runs are merged into the key, id and type sections. The reverse array is filled through
+    an mmap of the output file in a last pass. When a UUID occurs more than once the first entry
+    wins, as it did in create_json.py.
+    '''
+
+    def __init__(self, index_file_location, metadata = None, memory_budget_mb = 256, temp_dir = None):
+        check_byte_order()
+        self.index_file_location = index_file_location
+        self.metadata = dict(metadata) if metadata is not None else dict()
+        self.metadata.setdefault("tables", {str(type_code): table for table, type_code in table_types.items()})
+        self.run_records = max(memory_budget_mb * 1024 * 1024 // RUN_RECORD_MEMORY, 1024)
+        self.temp_dir = tempfile.mkdtemp(prefix='node_index_', dir=temp_dir if temp_dir is not None else os.path.dirname(os.path.abspath(index_file_location)))
+        self.buffer = []
+        self.runs = []
+        self.order = 0
+        self.uuid_upper = None
+
+    def add(self, uuid_string, type_code, node_id):
+        if self.uuid_upper is None:
+            self.uuid_upper = uuid_string == uuid_string.upper()
+        self.buffer.append(RUN_RECORD.pack(uuid_to_bytes(uuid_string), self.order, type_code, node_id))
+        self.order += 1
+        if len(self.buffer) >= self.run_records:
+            self.spill()
+
+    def spill(self):
+        self.buffer.sort()
+        run_location = os.path.join(self.temp_dir, 'run_{}'.format(len(self.runs)))
+        with open(run_location, 'wb') as f:
+            f.write(b''.join(self.buffer))
+        self.runs.append(run_location)
+        self.buffer = []
+
+    def merged_records(self):
+        if len(self.runs) == 0:
+            # Everything fit in memory, no need to go through the disk.
+            self.buffer.sort()
+            return iter(self.buffer)
+        if len(self.buffer) > 0:
+            self.spill()
+        return heapq.merge(*[read_run(run_location) for run_location in self.runs])
+
+    def finish(self):
+        '''
+        Writes the index file and removes the temporary files.
+        Returns the number of entries written and the number of duplicates dropped.
+        '''
+        try:
+            return self.write_index()
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write_index(self):
+        fanout = array.array('q', [0]) * FANOUT_SIZE
+        entry_count = 0
+        duplicates = 0
+        min_id = None
+        max_id = None
+        previous_key = None
+        keys_location = os.path.join(self.temp_dir, 'keys')
+        ids_location = os.path.join(self.temp_dir, 'ids')
+        types_location = os.path.join(self.temp_dir, 'types')
+        with open(keys_location, 'wb') as keys_file, open(ids_location, 'wb') as ids_file, open(types_location, 'wb') as types_file:
+            keys = bytearray()
+            ids = array.array('q')
+            types = array.array('b')
+            for record in self.merged_records():
+                key, order, type_code, node_id = RUN_RECORD.unpack(record)
+                if key == previous_key:
+                    duplicates += 1
+                    continue
+                previous_key = key
+                keys += key
+                ids.append(node_id)
+                types.append(type_code)
+                fanout[((key[0] << 8) | key[1]) + 1] += 1
+                entry_count += 1
+                if min_id is None or node_id < min_id:
+                    min_id = node_id
+                if max_id is None or node_id > max_id:
+                    max_id = node_id
+                if len(ids) >= 65536:
+                    keys_file.write(keys)
+                    ids_file.write(ids.tobytes())
+                    types_file.write(types.tobytes())
+                    keys = bytearray()
+                    ids = array.array('q')
+                    types = array.array('b')
+            keys_file.write(keys)
+            ids_file.write(ids.tobytes())
+            types_file.write(types.tobytes())
+        self.buffer = []
+        for prefix in range(1, FANOUT_SIZE):
+            fanout[prefix] += fanout[prefix - 1]
+
+        reverse_base = min_id if min_id is not None else 0
+        reverse_count = max_id - min_id + 1 if min_id is not None else 0
+        self.metadata["uuid_upper"] = self.uuid_upper if self.uuid_upper is not None else True
+        metadata_bytes = json.dumps(self.metadata).encode('utf-8')
+
+        temp_location = self.index_file_location + '.tmp'
+        with open(temp_location, 'w+b') as f:
+            def pad():
+                f.write(b'\x00' * (align(f.tell()) - f.tell()))
+            def copy_section(location):
+                with open(location, 'rb') as section:
+                    shutil.copyfileobj(section, f, COPY_BLOCK)
+                pad()
+            f.write(struct.pack(HEADER_FORMAT, INDEX_MAGIC, entry_count, reverse_base, reverse_count, len(metadata_bytes)))
+            f.write(metadata_bytes)
+            pad()
+            f.write(fanout.tobytes())
+            copy_section(keys_location)
+            copy_section(ids_location)
+            copy_section(types_location)
+            reverse_offset = f.tell()
+            reverse_types_offset = reverse_offset + align(reverse_count * KEY_SIZE)
+            f.truncate(reverse_types_offset + align(reverse_count))
+            f.flush()
+            if reverse_count > 0:
+                self.fill_reverse(f, reverse_offset, reverse_types_offset, reverse_base, keys_location, ids_location, types_location)
+        os.replace(temp_location, self.index_file_location)
+        return entry_count, duplicates
+
+    def fill_reverse(self, f, reverse_offset, reverse_types_offset, reverse_base, keys_location, ids_location, types_location):
+        # The sections are read back in blocks and every entry is written to its id's slot through the mapping.
+        block_entries = 65536
+        mapping = mmap.mmap(f.fileno(), 0)
+        try:
+            with open(keys_location, 'rb') as keys_file, open(ids_location, 'rb') as ids_file, open(types_location, 'rb') as types_file:
+                while True:
+                    keys = keys_file.read(block_entries * KEY_SIZE)
+                    if not keys:
+                        break
+                    ids = array.array('q')
+                    ids.frombytes(ids_file.read(block_entries * 8))
+                    types = types_file.read(block_entries)
+                    for position in range(len(ids)):
+                        slot = ids[position] - reverse_base
+                        start = reverse_offset + slot * KEY_SIZE
+                        mapping[start:start+KEY_SIZE] = keys[position*KEY_SIZE:(position+1)*KEY_SIZE]
+                        mapping[reverse_types_offset + slot] = types[position]
+            mapping.flush()
+        finally:
+            mapping.close()
+
+
+def write_node_index(index_file_location, entries, metadata = None, memory_budget_mb = 256):
+    '''
+    Writes the index for entries, an iterable of (uuid, type code, node id).
+    Returns the number of entries written and the number of duplicates dropped.
+    '''
+    writer = NodeIndexWriter(index_file_location, metadata, memory_budget_mb)
+    for uuid_string, type_code, node_id in entries:
+        writer.add(uuid_string, type_code, node_id)
+    return writer.finish()
+
+
+class KeyColumn:
+    # Sequence view of the sorted keys for bisect, every item is a 16 byte slice of the buffer.
+
+    def __init__(self, buffer, offset, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        start = self.offset + position * KEY_SIZE
+        # bytes() is free for an mmap slice and makes a shared memory slice comparable.
+        return bytes(self.buffer[start:start+KEY_SIZE])
+
+
+class NodeIndex:
+    '''
+    Read-only view of a binary node index. index[uuid] and index.get(uuid) return
+    [type, node id, table] like the uuid entries of index_file.json, and
+    index.reverse_lookup(node_id) returns (type, uuid).
+    '''
+
+    def __init__(self, index_file_location):
+        check_byte_order()
+        self.location = index_file_location
+        self.shared_memory = None
+        self.file = open(index_file_location, 'rb')
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.open_buffer(self.mapping)
+
+    @classmethod
+    def attach(cls, shared_memory_name):
+        '''
+        Opens an index another process copied into shared memory (see share_index).
+        Nothing is copied, the arrays are read-only views on the shared block.
+        '''
+        check_byte_order()
+        node_index = cls.__new__(cls)
+        node_index.location = 'shared memory ' + shared_memory_name
+        node_index.file = None
+        node_index.mapping = None
+        node_index.shared_memory = attach_shared_memory(shared_memory_name)
+        node_index.open_buffer(node_index.shared_memory.buf.toreadonly())
+        return node_index
+
+    def open_buffer(self, buffer):
+        magic, self.entry_count, self.reverse_base, self.reverse_count, metadata_length = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("{} is not a binary node index".format(self.location))
+        self.buffer = buffer
+        view = memoryview(buffer)
+        offset = HEADER_SIZE
+        self.metadata = json.loads(bytes(view[offset:offset+metadata_length]).decode('utf-8'))
+        offset += align(metadata_length)
+        self.fanout = view[offset:offset+FANOUT_SIZE*8].cast('q')
+        offset += FANOUT_SIZE * 8
+        self.keys_offset = offset
+        self.keys = KeyColumn(buffer, offset, self.entry_count)
+        offset += align(self.entry_count * KEY_SIZE)
+        self.ids = view[offset:offset+self.entry_count*8].cast('q')
+        offset += self.entry_count * 8
+        self.types = view[offset:offset+self.entry_count].cast('b')
+        offset += align(self.entry_count)
+        self.reverse_offset = offset
+        offset += align(self.reverse_count * KEY_SIZE)
+        self.reverse_types = view[offset:offset+self.reverse_count].cast('b')
+        self.tables = {int(type_code): table for type_code, table in self.metadata["tables"].items()}
+        self.uuid_upper = self.metadata.get("uuid_upper", True)
+
+    def find(self, uuid_string):
+        # Position of the uuid in the sorted keys, or -1.
+        try:
+            key = uuid_to_bytes(uuid_string)
+        except (ValueError, AttributeError):
+            return -1
+        prefix = (key[0] << 8) | key[1]
+        lo = self.fanout[prefix]
+        hi = self.fanout[prefix + 1]
+        position = bisect.bisect_left(self.keys, key, lo, hi)
+        if position < hi and self.keys[position] == key:
+            return position
+        return -1
+
+    def get(self, uuid_string, default = None):
+        position = self.find(uuid_string)
+        if position < 0:
+            return default
+        type_code = self.types[position]
+        return [type_code, self.ids[position], self.tables.get(type_code)]
+
+    def __getitem__(self, uuid_string):
+        entry = self.get(uuid_string)
+        if entry is None:
+            raise KeyError(uuid_string)
+        return entry
+
+    def __contains__(self, uuid_string):
+        return self.find(uuid_string) >= 0
+
+    def __len__(self):
+        return self.entry_count
+
+    def reverse_lookup(self, node_id):
+        '''
+        (type, uuid) of a node id, which may be given as an int or a string as in the
+        edgelist files. None for ids that are not in the index.
+        '''
+        try:
+            slot = int(node_id) - self.reverse_base
+        except ValueError:
+            return None
+        if slot < 0 or slot >= self.reverse_count or self.reverse_types[slot] == 0:
+            return None
+        start = self.reverse_offset + slot * KEY_SIZE
+        return self.reverse_types[slot], bytes_to_uuid(self.buffer[start:start+KEY_SIZE], self.uuid_upper)
+
+    def items(self):
+        # (uuid, [type, node id, table]) for every entry, in key order.
+        for position in range(self.entry_count):
+            type_code = self.types[position]
+            yield bytes_to_uuid(self.keys[position], self.uuid_upper), [type_code, self.ids[position], self.tables.get(type_code)]
+
+    def reverse_items(self):
+        # (node id, uuid) for every used slot of the reverse array, in id order.
+        for slot in range(self.reverse_count):
+            if self.reverse_types[slot] != 0:
+                start = self.reverse_offset + slot * KEY_SIZE
+                yield self.reverse_base + slot, bytes_to_uuid(self.buffer[start:start+KEY_SIZE], self.uuid_upper)
+
+    def reverse_slots_in_use(self, first, last):
+        '''
+        The used reverse slots of the node ids first..last as an int holding one byte per id,
+        byte i (little endian) is 1 when first + i is in the index. Ints of several segments
+        combine with |, all without a Python step per id.
+        '''
+        first_slot = max(first - self.reverse_base, 0)
+        last_slot = min(last - self.reverse_base, self.reverse_count - 1)
+        if first_slot > last_slot:
+            return 0
+        flags = self.reverse_types[first_slot:last_slot+1].tobytes().translate(USED_SLOT_TABLE)
+        return int.from_bytes(flags, 'little') << (8 * (self.reverse_base + first_slot - first))
+
+    def reverse_view(self):
+        # Mapping of node id -> [type, uuid], the format of the reverse index file summarize.py reads.
+        return ReverseView(self, with_type=True)
+
+    def uuid_view(self):
+        # Mapping of node id -> uuid, the id entries of index_file.json.
+        return ReverseView(self, with_type=False)
+
+    def close(self):
+        self.fanout.release()
+        self.ids.release()
+        self.types.release()
+        self.reverse_types.release()
+        if self.shared_memory is not None:
+            self.buffer.release()
+            self.buffer = None
+            self.keys = None
+            self.shared_memory.close()
+        else:
+            self.mapping.close()
+            self.file.close()
+
+
+class ReverseView:
+
+    def __init__(self, node_index, with_type):
+        self.node_index = node_index
+        self.with_type = with_type
+
+    def get(self, node_id, default = None):
+        entry = self.node_index.reverse_lookup(node_id)
+        if entry is None:
+            return default
+        return [entry[0], entry[1]] if self.with_type else entry[1]
+
+    def __getitem__(self, node_id):
+        entry = self.get(node_id)
+        if entry is None:
+            raise KeyError(node_id)
+        return entry
+
+    def __contains__(self, node_id):
+        return self.node_index.reverse_lookup(node_id) is not None
+
+
+def allocate_id_ranges(table_max_ids, headroom = 0.0, template_capacity = None, previous_ranges = None, minimum_headroom = 1000):
+    '''
+    Lays the node id space out as consecutive ranges: every table, in the order of table_max_ids
+    (table -> MAX(id)), gets MAX(id) ids plus headroom (a fraction of its size kept free for
+    appended rows, at least minimum_headroom ids when headroom is not 0), followed by a range per
+    template type. A table's node id is its row id plus the range offset, as the hand written
+    offset tables did it.
+    With previous_ranges (the id_ranges metadata of an older index) the old layout is kept as long
+    as it was allocated with the same headroom and every table still fits into its range, so node
+    ids stay stable across rebuilds.
+    Returns the id_ranges metadata: {"tables": {...}, "templates": {...}}.
+    '''
+    if template_capacity is None:
+        template_capacity = {template_type: default_template_capacity for template_type in template_types}
+
+    if previous_ranges is not None and previous_ranges.get("headroom") != headroom:
+        print("The previous index was allocated with headroom {}, allocating new ranges with {}.".format(previous_ranges.get("headroom"), headroom))
+    elif previous_ranges is not None:
+        previous_tables = previous_ranges["tables"]
+        if all([table in previous_tables and max_id <= previous_tables[table]["last"] - previous_tables[table]["offset"]
+                for table, max_id in table_max_ids.items()]):
+            return previous_ranges
+        print("The tables outgrew the id ranges of the previous index, allocating new ranges.")
+
+    tables = dict()
+    next_offset = 0
+    for table, max_id in table_max_ids.items():
+        max_id = max_id if max_id is not None else 0
+        size = max_id
+        if headroom > 0:
+            size += max(int(max_id * headroom + 0.5), minimum_headroom)
+        tables[table] = {"type": table_types[table], "offset": next_offset, "first": next_offset + 1, "last": next_offset + size}
+        next_offset += size
+
+    templates = dict()
+    for template_type, type_code in template_types.items():
+        size = template_capacity[template_type]
+        templates[template_type] = {"type": type_code, "first": next_offset + 1, "last": next_offset + size}
+        next_offset += size
+
+    return {"headroom": headroom, "tables": tables, "templates": templates}
+
+
+def get_template_first_id(index, template_type):
+    '''
+    First id of a template type: from the ranges of a binary index, or the old
+    fixed values when the index is an index_file.json dict.
+    '''
+    if is_binary_index(index) and "id_ranges" in index.metadata:
+        return index.metadata["id_ranges"]["templates"][template_type]["first"]
+    return legacy_template_ids[template_type]
+
+
+class NodeTypeResolver:
+    '''
+    Node type of a node id from the id range table alone: every table and template type owns a
+    contiguous id range, so the type is found by bisecting the range starts, without a reverse
+    index lookup. resolve_many classifies a whole list or int64 array of ids at once, vectorized
+    with numpy when it is installed. Ids outside every range resolve to 0.
+
+    A table range also holds the headroom kept free for rows appended later. With the high-water
+    marks of the manifest a table range ends at the last id handed out, so headroom ids resolve
+    to 0 as well. Without them, and for ids of rows missing below the mark, the range decides.
+    '''
+
+    def __init__(self, ranges):
+        # ranges: (first id, last id, type code), empty ranges are left out
+        ranges = sorted([id_range for id_range in ranges if id_range[1] >= id_range[0]])
+        self.firsts = [id_range[0] for id_range in ranges]
+        self.lasts = [id_range[1] for id_range in ranges]
+        self.types = [id_range[2] for id_range in ranges]
+        if np is not None:
+            self.np_firsts = np.array(self.firsts, dtype=np.int64)
+            self.np_lasts = np.array(self.lasts, dtype=np.int64)
+            self.np_types = np.array(self.types, dtype=np.int8)
+
+    @classmethod
+    def from_id_ranges(cls, id_ranges, high_water_marks = None):
+        ranges = []
+        for table, table_range in id_ranges["tables"].items():
+            last = table_range["last"]
+            if high_water_marks is not None and table in high_water_marks:
+                last = min(last, table_range["offset"] + high_water_marks[table])
+            ranges.append((table_range["first"], last, table_range["type"]))
+        ranges += [(template_range["first"], template_range["last"], template_range["type"]) for template_range in id_ranges["templates"].values()]
+        return cls(ranges)
+
+    def resolve(self, node_id):
+        node_id = int(node_id)
+        position = bisect.bisect_right(self.firsts, node_id) - 1
+        if position >= 0 and node_id <= self.lasts[position]:
+            return self.types[position]
+        return 0
+
+    def resolve_many(self, node_ids):
+        if np is None:
+            return [self.resolve(node_id) for node_id in node_ids]
+        if isinstance(node_ids, np.ndarray):
+            ids = node_ids.astype(np.int64, copy=False)
+        elif isinstance(node_ids, array.array) and node_ids.typecode == 'q':
+            # The id columns of EdgeArrays and ProvenanceGraph are used without a copy.
+            ids = np.frombuffer(node_ids, dtype=np.int64)
+        else:
+            ids = np.fromiter((int(node_id) for node_id in node_ids), dtype=np.int64, count=len(node_ids))
+        if len(self.firsts) == 0:
+            return np.zeros(len(ids), dtype=np.int8)
+        positions = np.searchsorted(self.np_firsts, ids, side='right') - 1
+        clipped = positions.clip(0, max(len(self.firsts) - 1, 0))
+        found = (positions >= 0) & (ids <= self.np_lasts[clipped])
+        return np.where(found, self.np_types[clipped], 0)
+
+    def select(self, node_ids, type_code):
+        # The nodes of node_ids that have the given type, in their original order.
+        node_ids = list(node_ids)
+        return [node_id for node_id, node_type in zip(node_ids, self.resolve_many(node_ids)) if node_type == type_code]
+
+
+class ReverseIndexTypeResolver:
+    '''
+    Same interface as NodeTypeResolver for indices without id ranges (index_file.json, or a
+    binary index converted from one): the type is looked up per node in a reverse index that
+    maps str(node id) -> [type, uuid]. Ids it does not hold resolve to 0.
+    '''
+
+    def __init__(self, reverse_index):
+        self.reverse_index = reverse_index
+
+    def resolve(self, node_id):
+        entry = self.reverse_index.get(str(node_id))
+        if isinstance(entry, list):
+            return entry[0]
+        return 0
+
+    def resolve_many(self, node_ids):
+        return [self.resolve(node_id) for node_id in node_ids]
+
+    def select(self, node_ids, type_code):
+        return [node_id for node_id in node_ids if self.resolve(node_id) == type_code]
+
+
+def get_node_type_resolver(index, reverse_index):
+    '''
+    Resolver for the ranges of a binary index, cut at the high-water marks of its manifest, or
+    one backed by reverse_index lookups when the index has no ranges, which works for any dataset.
+    '''
+    if is_binary_index(index) and "id_ranges" in index.metadata:
+        manifest = load_manifest(index.location)
+        high_water_marks = manifest["high_water_marks"] if manifest is not None else None
+        return NodeTypeResolver.from_id_ranges(index.metadata["id_ranges"], high_water_marks)
+    return ReverseIndexTypeResolver(reverse_index)
+
+
+def attach_shared_memory(shared_memory_name):
+    try:
+        # Python 3.13+: an attached block is not tracked, only its creator unlinks it.
+        return shared_memory.SharedMemory(name=shared_memory_name, track=False)
+    except TypeError:
+        # Older versions register the block again, which is harmless for pool workers since
+        # they report to the resource tracker of the parent that created it.
+        return shared_memory.SharedMemory(name=shared_memory_name)
+
+
+def share_index(index_file_location):
+    '''
+    Copies an index file into a new shared memory block and returns the block. The caller
+    keeps it open while workers use it and then calls close() and unlink() on it.
+    Only the base file is copied, an index with delta segments has to be compacted first
+    (compact_index), which is left to the caller as it rewrites the index on disk.
+    '''
+    manifest = load_manifest(index_file_location)
+    if manifest is not None and len(manifest["segments"]) > 0:
+        raise ValueError("{} has {} delta segments, compact it before sharing".format(index_file_location, len(manifest["segments"])))
+    size = os.path.getsize(index_file_location)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    view = block.buf[:size]
+    with open(index_file_location, 'rb') as f:
+        position = 0
+        while position < size:
+            read = f.readinto(view[position:])
+            if not read:
+                break
+            position += read
+    view.release()
+    return block
+
+
+class IndexHandle:
+    '''
+    Picklable reference to an index for worker processes. With a file location workers map the
+    file themselves and share its pages through the page cache, with a shared memory name they
+    attach to the block a parent filled with share_index. Either way nothing is parsed or copied.
+    '''
+
+    def __init__(self, index_file_location = None, shared_memory_name = None):
+        self.index_file_location = index_file_location
+        self.shared_memory_name = shared_memory_name
+
+    def open(self):
+        if self.shared_memory_name is not None:
+            return NodeIndex.attach(self.shared_memory_name)
+        return open_binary_index(self.index_file_location)
+
+
+def init_index_worker(index_handle):
+    # Pool initializer: every worker opens the shared index once, read only.
+    global worker_index
+    worker_index = index_handle.open()
+
+
+def get_worker_index():
+    return worker_index
+
+
+def convert_json_index(json_index_file_location, index_file_location):
+    '''
+    Writes a binary index for an old index_file.json, so that it can be mapped and
+    shared instead of loaded by every process. Returns what write_node_index returns.
+    '''
+    with open(json_index_file_location, 'r') as f:
+        json_index = json.load(f)
+    # Only the uuid -> [type, id, table] entries are needed, the id -> uuid half is rebuilt from them.
+    entries = [(key, value[0], value[1]) for key, value in json_index.items() if isinstance(value, list)]
+    del json_index
+    return write_node_index(index_file_location, entries)
+
+
+def get_manifest_location(index_file_location):
+    return index_file_location + '.manifest.json'
+
+
+def load_manifest(index_file_location):
+    '''
+    The manifest of a binary index: the high-water mark (largest indexed row id) of every table,
+    the delta segments appended by incremental updates, and the number of updates so far.
+    None if the index was never given one.
+    '''
+    manifest_location = get_manifest_location(index_file_location)
+    if not os.path.exists(manifest_location):
+        return None
+    with open(manifest_location, 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(index_file_location, manifest):
+    manifest_location = get_manifest_location(index_file_location)
+    with open(manifest_location + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(manifest_location + '.tmp', manifest_location)
+
+
+class SegmentedIndex:
+    '''
+    A base index together with the delta segments incremental updates appended to it, used as one
+    index with the NodeIndex interface. Segments never repeat a uuid of the base or of each other,
+    and every node id belongs to exactly one of them.
+    '''
+
+    def __init__(self, index_file_location, manifest):
+        directory = os.path.dirname(os.path.abspath(index_file_location))
+        self.location = index_file_location
+        self.segments = [NodeIndex(index_file_location)]
+        self.segments += [NodeIndex(os.path.join(directory, segment_name)) for segment_name in manifest["segments"]]
+        self.metadata = self.segments[0].metadata
+
+    def get(self, uuid_string, default = None):
+        for segment in self.segments:
+            entry = segment.get(uuid_string)
+            if entry is not None:
+                return entry
+        return default
+
+    def __getitem__(self, uuid_string):
+        entry = self.get(uuid_string)
+        if entry is None:
+            raise KeyError(uuid_string)
+        return entry
+
+    def __contains__(self, uuid_string):
+        return self.get(uuid_string) is not None
+
+    def __len__(self):
+        return sum([len(segment) for segment in self.segments])
+
+    def reverse_lookup(self, node_id):
+        for segment in self.segments:
+            entry = segment.reverse_lookup(node_id)
+            if entry is not None:
+                return entry
+        return None
+
+    def reverse_view(self):
+        return ReverseView(self, with_type=True)
+
+    def uuid_view(self):
+        return ReverseView(self, with_type=False)
+
+    def items(self):
+        # Segment by segment, keys are sorted within a segment only.
+        for segment in self.segments:
+            for item in segment.items():
+                yield item
+
+    def reverse_items(self):
+        for segment in self.segments:
+            for item in segment.reverse_items():
+                yield item
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+def missing_node_ids(index, first, last):
+    # Node ids in first..last that no segment of a binary index holds, in ascending order.
+    if last < first:
+        return []
+    segments = index.segments if isinstance(index, SegmentedIndex) else [index]
+    used = 0
+    for segment in segments:
+        used |= segment.reverse_slots_in_use(first, last)
+    flags = used.to_bytes(last - first + 1, 'little')
+    missing = []
+    position = flags.find(b'\x00')
+    while position >= 0:
+        missing.append(first + position)
+        position = flags.find(b'\x00', position + 1)
+    return missing
+
+
+def is_binary_index(index):
+    return isinstance(index, (NodeIndex, SegmentedIndex))
+
+
+def open_binary_index(index_file_location):
+    # The base index alone, or with its delta segments when incremental updates added some.
+    manifest = load_manifest(index_file_location)
+    if manifest is not None and len(manifest["segments"]) > 0:
+        return SegmentedIndex(index_file_location, manifest)
+    return NodeIndex(index_file_location)
+
+
+def compact_index(index_file_location, memory_budget_mb = 256):
+    '''
+    Merges the delta segments of an index back into a single base file and empties the
+    segment list of its manifest. Node ids do not change.
+    '''
+    manifest = load_manifest(index_file_location)
+    if manifest is None or len(manifest["segments"]) == 0:
+        return
+    index = SegmentedIndex(index_file_location, manifest)
+    writer = NodeIndexWriter(index_file_location, index.metadata, memory_budget_mb)
+    try:
+        for uuid_string, entry in index.items():
+            writer.add(uuid_string, entry[0], entry[1])
+    finally:
+        index.close()
+    # The new base replaces the old one before the manifest stops listing the segments, and the
+    # segment files go last, so an interruption leaves at most unused files behind.
+    writer.finish()
+    directory = os.path.dirname(os.path.abspath(index_file_location))
+    segment_names = manifest["segments"]
+    manifest["segments"] = []
+    write_manifest(index_file_location, manifest)
+    for segment_name in segment_names:
+        os.remove(os.path.join(directory, segment_name))
+
+
+def load_index(index_file_location):
+    '''
+    Opens either index format: a NodeIndex (or SegmentedIndex after incremental updates)
+    for a binary index, the parsed dict for index_file.json.
+    '''
+    if is_node_index(index_file_location):
+        return open_binary_index(index_file_location)
+    with open(index_file_location, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,110 @@
+'''
+This file contains the reader for the Parquet dataset written by the parquet loader of
+Reference/data_dumping.py (see Reference/parquet_sink.py). It serves the same column
+projections the scripts in this directory run against PostgreSQL, so the index and the
+graphs can be rebuilt from the files without a live database.
+The files carry no id column. Ids are handed out the way the serial id column does it,
+1, 2, 3, ... over the rows of a table in sorted part file order. A part file added by a later
+ingest can sort before existing ones and shifts the ids of every row after it, so an index built
+from the dataset records get_parts_fingerprint and has to be rebuilt once that changes.
+'''
+
+import os
+import json
+import zlib
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pq = None
+
+NANOS_PER_DAY = 86400 * 1000000000
+
+
+def list_part_files(dataset_dir, table_name):
+    # day=YYYY-MM-DD directories sort chronologically, day=unknown comes last.
+    part_files = []
+    for root, dirs, files in os.walk(os.path.join(dataset_dir, table_name)):
+        for name in files:
+            if name.endswith('.parquet'):
+                part_files.append(os.path.join(root, name))
+    part_files.sort()
+    return part_files
+
+
+def get_day_range(part_file):
+    # [first, last) nanosecond of the day partition holding the file, None outside a day partition.
+    partition = os.path.basename(os.path.dirname(part_file))
+    if not partition.startswith('day='):
+        return None
+    day = partition[len('day='):]
+    if day == 'unknown':
+        return (0, 0)
+    day_start = int(datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp()) * 1000000000
+    return (day_start, day_start + NANOS_PER_DAY)
+
+
+def scan_table(dataset_dir, table_name, columns, batch_size = 1000000, time_range = None):
+    '''
+    Yields the rows of a table as lists of tuples holding the requested columns, at most
+    batch_size rows at a time. 'id' can be requested like any other column.
+    time_range = (start, end) keeps the rows with start <= time_stamp_nanos < end, like
+    the WHERE clauses on "Event". Whole day partitions outside the range are skipped by
+    their row count without being read.
+    '''
+    if pq is None:
+        raise ImportError("pyarrow is required to read the parquet dataset")
+
+    file_columns = [column for column in columns if column != 'id']
+    if time_range is not None and 'time_stamp_nanos' not in file_columns:
+        file_columns.append('time_stamp_nanos')
+
+    next_id = 1
+    for part_file in list_part_files(dataset_dir, table_name):
+        parquet_file = pq.ParquetFile(part_file)
+        if time_range is not None:
+            day_range = get_day_range(part_file)
+            if day_range is not None and (day_range[1] <= time_range[0] or day_range[0] >= time_range[1]):
+                next_id += parquet_file.metadata.num_rows
+                continue
+
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=file_columns):
+            ids = pa.array(range(next_id, next_id + batch.num_rows), type=pa.int64())
+            next_id += batch.num_rows
+            arrays = {name: batch.column(name) for name in file_columns}
+            arrays['id'] = ids
+            if time_range is not None:
+                time_stamps = arrays['time_stamp_nanos']
+                mask = pc.and_(pc.greater_equal(time_stamps, time_range[0]), pc.less(time_stamps, time_range[1]))
+                # Rows without a timestamp never match, as in SQL.
+                mask = pc.fill_null(mask, False)
+                arrays = {name: pc.filter(array, mask) for name, array in arrays.items()}
+            yield list(zip(*[arrays[column].to_pylist() for column in columns]))
+
+
+def get_parts_fingerprint(dataset_dir, tables):
+    # Checksum over the part file names and row counts of the tables, the two things the ids depend on.
+    parts = []
+    for table_name in sorted(tables):
+        for part_file in list_part_files(dataset_dir, table_name):
+            parts.append([os.path.relpath(part_file, dataset_dir), pq.ParquetFile(part_file).metadata.num_rows])
+    return zlib.crc32(json.dumps(parts).encode('utf-8'))
+
+
+def index_matches_dataset(index_metadata, dataset_dir):
+    '''
+    False when the part files of the tables an index covers changed since it was built from
+    dataset_dir, then its node ids no longer match the row ids scan_table hands out.
+    '''
+    if "parquet_parts" not in index_metadata:
+        return False
+    return get_parts_fingerprint(dataset_dir, index_metadata["id_ranges"]["tables"].keys()) == index_metadata["parquet_parts"]
+
+
+def table_row_count(dataset_dir, table_name):
+    return sum([pq.ParquetFile(part_file).metadata.num_rows for part_file in list_part_files(dataset_dir, table_name)])
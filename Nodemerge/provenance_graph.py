@@ -0,0 +1,372 @@
+'''
+This file contains ProvenanceGraph, a column store for the provenance graphs the Nodemerge
+scripts build, in place of a networkx.MultiDiGraph with one attribute dict per edge.
+
+Every edge is one row of typed arrays:
+    sources, destinations, times, event_ids     int64
+    src_types, dst_types                        int8 node type codes
+    event_types                                 int32 codes into event_type_names
+    attrs                                       int32 codes into attr_values, NO_ATTR (-1) for no attr
+
+An edge without an attr and an edge with attr None differ, as they do in networkx: add_edge
+takes NO_ATTR as the default, and None is interned like any other value.
+
+Edges keep the order they were added in. Adjacency is kept in CSR form over the sorted node ids:
+out_order lists the edge numbers grouped by source node, out_offsets[i]:out_offsets[i + 1] is
+the slice of node i, and in_order / in_offsets do the same by destination. The CSR arrays are
+rebuilt on the first query after edges were added, with numpy when it is installed.
+
+add_edge takes the same keywords the scripts pass to networkx, and edge data comes back as the
+same dicts, so the graph can be swapped in where edges are added and iterated, and converted
+with to_networkx / from_networkx where networkx algorithms are still needed.
+
+With track_components the weakly connected components are labeled by a union-find while edges
+are added, and write_component_edgelists writes every large enough component straight from the
+columns, without a subgraph per component.
+
+Only graph construction (nm_graph_construction.py) builds ProvenanceGraphs. summarize.py and
+Evaluation/Parser/unicorn_preprocess.py keep reading the dumped edgelists with networkx:
+nx.read_edgelist gives an undirected simple graph with string node ids, so every edge shows up
+in both directions and the last of parallel lines wins, and unicorn_preprocess merges the graphs
+with nx.compose_all. A directed multigraph with int ids would change what those stages compute.
+'''
+
+import os
+import ast
+import bisect
+from array import array
+from union_find import UnionFind
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NO_ATTR = -1
+
+
+class ProvenanceGraph:
+
+    def __init__(self, track_components = False):
+        self.sources = array('q')
+        self.destinations = array('q')
+        self.times = array('q')
+        self.event_ids = array('q')
+        self.src_types = array('b')
+        self.dst_types = array('b')
+        self.event_types = array('i')
+        self.attrs = array('i')
+        self.event_type_names = []
+        self.event_type_codes = dict()
+        self.attr_values = []
+        self.attr_codes = dict()
+        self.node_ids = array('q')
+        self.out_order = array('q')
+        self.out_offsets = array('q', [0])
+        self.in_order = array('q')
+        self.in_offsets = array('q', [0])
+        self.indexed_edge_count = 0
+        self.component_sets = UnionFind() if track_components else None
+
+    def intern_event_type(self, event_type):
+        code = self.event_type_codes.get(event_type)
+        if code is None:
+            code = len(self.event_type_names)
+            self.event_type_codes[event_type] = code
+            self.event_type_names.append(event_type)
+        return code
+
+    def intern_attr(self, attr):
+        if attr == NO_ATTR:
+            return NO_ATTR
+        code = self.attr_codes.get(attr)
+        if code is None:
+            code = len(self.attr_values)
+            self.attr_codes[attr] = code
+            self.attr_values.append(attr)
+        return code
+
+    def add_edge(self, src, dst, src_type = 0, dst_type = 0, event_type = None, time = 0, id = 0, attr = NO_ATTR):
+        self.sources.append(int(src))
+        self.destinations.append(int(dst))
+        self.src_types.append(src_type)
+        self.dst_types.append(dst_type)
+        self.event_types.append(self.intern_event_type(event_type))
+        self.times.append(time)
+        self.event_ids.append(id)
+        self.attrs.append(self.intern_attr(attr))
+        if self.component_sets is not None:
+            self.component_sets.union(src, dst)
+
+    def number_of_edges(self):
+        return len(self.sources)
+
+    def number_of_nodes(self):
+        self.build_index()
+        return len(self.node_ids)
+
+    def nodes(self):
+        self.build_index()
+        return list(self.node_ids)
+
+    def has_node(self, node):
+        return self.node_position(node) is not None
+
+    def __contains__(self, node):
+        return self.has_node(node)
+
+    def __len__(self):
+        return self.number_of_nodes()
+
+    def node_position(self, node):
+        self.build_index()
+        node = int(node)
+        position = bisect.bisect_left(self.node_ids, node)
+        if position < len(self.node_ids) and self.node_ids[position] == node:
+            return position
+        return None
+
+    def build_index(self):
+        # CSR adjacency over the edges added so far, skipped while it is up to date.
+        edge_count = len(self.sources)
+        if edge_count == self.indexed_edge_count:
+            return
+        if np is not None:
+            self.build_index_numpy()
+        else:
+            self.build_index_python()
+        self.indexed_edge_count = edge_count
+
+    def build_index_numpy(self):
+        sources = np.frombuffer(self.sources, dtype=np.int64)
+        destinations = np.frombuffer(self.destinations, dtype=np.int64)
+        node_ids = np.unique(np.concatenate([sources, destinations]))
+        node_count = len(node_ids)
+        self.node_ids = array('q', node_ids.tobytes())
+        for column, order_name, offsets_name in ((sources, 'out_order', 'out_offsets'), (destinations, 'in_order', 'in_offsets')):
+            positions = np.searchsorted(node_ids, column)
+            # A stable sort keeps the edges of a node in the order they were added.
+            order = np.argsort(positions, kind='stable').astype(np.int64)
+            offsets = np.zeros(node_count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(positions, minlength=node_count), out=offsets[1:])
+            setattr(self, order_name, array('q', order.tobytes()))
+            setattr(self, offsets_name, array('q', offsets.tobytes()))
+
+    def build_index_python(self):
+        node_ids = sorted(set(self.sources).union(self.destinations))
+        positions = {node: position for position, node in enumerate(node_ids)}
+        self.node_ids = array('q', node_ids)
+        for column, order_name, offsets_name in ((self.sources, 'out_order', 'out_offsets'), (self.destinations, 'in_order', 'in_offsets')):
+            # Counting sort of the edge numbers by node position.
+            offsets = [0] * (len(node_ids) + 1)
+            for node in column:
+                offsets[positions[node] + 1] += 1
+            for position in range(len(node_ids)):
+                offsets[position + 1] += offsets[position]
+            next_slot = offsets[:-1]
+            order = [0] * len(column)
+            for edge, node in enumerate(column):
+                position = positions[node]
+                order[next_slot[position]] = edge
+                next_slot[position] += 1
+            setattr(self, order_name, array('q', order))
+            setattr(self, offsets_name, array('q', offsets))
+
+    def edge_data(self, edge):
+        # Attributes of edge number edge, as networkx holds them.
+        data = {
+            "src_type": self.src_types[edge],
+            "dst_type": self.dst_types[edge],
+            "event_type": self.event_type_names[self.event_types[edge]],
+            "time": self.times[edge],
+            "id": self.event_ids[edge]
+        }
+        if self.attrs[edge] != NO_ATTR:
+            data["attr"] = self.attr_values[self.attrs[edge]]
+        return data
+
+    def edge_tuple(self, edge, data):
+        if data:
+            return (self.sources[edge], self.destinations[edge], self.edge_data(edge))
+        return (self.sources[edge], self.destinations[edge])
+
+    def edges(self, data = False):
+        for edge in range(len(self.sources)):
+            yield self.edge_tuple(edge, data)
+
+    def out_edge_numbers(self, node):
+        position = self.node_position(node)
+        if position is None:
+            return self.out_order[0:0]
+        return self.out_order[self.out_offsets[position]:self.out_offsets[position + 1]]
+
+    def in_edge_numbers(self, node):
+        position = self.node_position(node)
+        if position is None:
+            return self.in_order[0:0]
+        return self.in_order[self.in_offsets[position]:self.in_offsets[position + 1]]
+
+    def out_edges(self, node, data = False):
+        for edge in self.out_edge_numbers(node):
+            yield self.edge_tuple(edge, data)
+
+    def in_edges(self, node, data = False):
+        for edge in self.in_edge_numbers(node):
+            yield self.edge_tuple(edge, data)
+
+    def out_degree(self, node):
+        return len(self.out_edge_numbers(node))
+
+    def in_degree(self, node):
+        return len(self.in_edge_numbers(node))
+
+    def successors(self, node):
+        seen = set()
+        for edge in self.out_edge_numbers(node):
+            if self.destinations[edge] not in seen:
+                seen.add(self.destinations[edge])
+                yield self.destinations[edge]
+
+    def predecessors(self, node):
+        seen = set()
+        for edge in self.in_edge_numbers(node):
+            if self.sources[edge] not in seen:
+                seen.add(self.sources[edge])
+                yield self.sources[edge]
+
+    def weakly_connected_components(self):
+        # Node sets of the weakly connected components, from the union-find when components are
+        # tracked, else by a breadth first search over both directions.
+        if self.component_sets is not None:
+            for nodes in self.component_sets.components().values():
+                yield set(nodes)
+            return
+        self.build_index()
+        seen = bytearray(len(self.node_ids))
+        for start in range(len(self.node_ids)):
+            if seen[start]:
+                continue
+            seen[start] = 1
+            component = [self.node_ids[start]]
+            frontier = [start]
+            while frontier:
+                position = frontier.pop()
+                neighbours = [self.destinations[edge] for edge in self.out_order[self.out_offsets[position]:self.out_offsets[position + 1]]]
+                neighbours += [self.sources[edge] for edge in self.in_order[self.in_offsets[position]:self.in_offsets[position + 1]]]
+                for neighbour in neighbours:
+                    neighbour_position = bisect.bisect_left(self.node_ids, neighbour)
+                    if not seen[neighbour_position]:
+                        seen[neighbour_position] = 1
+                        component.append(neighbour)
+                        frontier.append(neighbour_position)
+            yield set(component)
+
+    def copy_edges(self, edge_numbers):
+        # New graph holding the given edges, in the given order, with their own code tables.
+        graph = ProvenanceGraph()
+        for edge in edge_numbers:
+            attr = self.attrs[edge]
+            graph.add_edge(self.sources[edge], self.destinations[edge], self.src_types[edge], self.dst_types[edge],
+                           self.event_type_names[self.event_types[edge]], self.times[edge], self.event_ids[edge],
+                           self.attr_values[attr] if attr != NO_ATTR else NO_ATTR)
+        return graph
+
+    def subgraph(self, nodes):
+        '''
+        The graph induced by nodes: every edge with both ends among them, in the original
+        order. Unlike networkx this is a copy, not a view.
+        '''
+        node_set = set([int(node) for node in nodes])
+        edge_numbers = []
+        for node in sorted(node_set):
+            for edge in self.out_edge_numbers(node):
+                if self.destinations[edge] in node_set:
+                    edge_numbers.append(edge)
+        edge_numbers.sort()
+        return self.copy_edges(edge_numbers)
+
+    def to_networkx(self):
+        import networkx as nx
+        graph = nx.MultiDiGraph()
+        for src, dst, data in self.edges(data=True):
+            graph.add_edge(src, dst, **data)
+        return graph
+
+    @classmethod
+    def from_networkx(cls, nx_graph):
+        # Node ids must be integers, or strings of them as read_edgelist returns them.
+        graph = cls()
+        for src, dst, data in nx_graph.edges(data=True):
+            graph.add_edge(src, dst, data.get("src_type", 0), data.get("dst_type", 0), data.get("event_type"),
+                           data.get("time", 0), data.get("id", 0), data.get("attr", NO_ATTR))
+        return graph
+
+    def node_ranks(self):
+        # Position of every node in the order networkx adds them: source, then destination, edge by edge.
+        ranks = dict()
+        for edge in range(len(self.sources)):
+            for node in (self.sources[edge], self.destinations[edge]):
+                if node not in ranks:
+                    ranks[node] = len(ranks)
+        return ranks
+
+    def adjacency_order(self, edge_numbers, ranks):
+        '''
+        edge_numbers (ascending) in the order networkx lists the edges of a MultiDiGraph: by source
+        in node order, then by destination in the order it became a successor of the source, then
+        in insertion order.
+        '''
+        first_pair_edge = dict()
+        for edge in edge_numbers:
+            first_pair_edge.setdefault((self.sources[edge], self.destinations[edge]), edge)
+        return sorted(edge_numbers, key=lambda edge: (ranks[self.sources[edge]], first_pair_edge[(self.sources[edge], self.destinations[edge])], edge))
+
+    def write_edgelist(self, path):
+        # Same lines in the same order as networkx.write_edgelist with data=True.
+        with open(path, 'w') as f:
+            for edge in self.adjacency_order(range(len(self.sources)), self.node_ranks()):
+                f.write('{} {} {}\n'.format(self.sources[edge], self.destinations[edge], self.edge_data(edge)))
+
+    def write_component_edgelists(self, destination_dir, min_nodes = 6, name_format = 'graph_{}.edgelist'):
+        '''
+        Writes the edges of every weakly connected component with at least min_nodes nodes to its
+        own edgelist in destination_dir. Needs track_components. Returns the number of files written.
+
+        Files are numbered in the order networkx finds the components (by their first node), and
+        the edges of a file come in networkx adjacency order, as nx.write_edgelist writes the
+        component graph. The subgraph views get_graphs dumps list the nodes of a component with
+        less than half of all nodes in Python set order instead, so for those the lines can be
+        ordered differently from the networkx path. The lines themselves are the same.
+        '''
+        component_sets = self.component_sets
+        ranks = self.node_ranks()
+        component_edges = dict()
+        for edge in range(len(self.sources)):
+            root = component_sets.find(self.sources[edge])
+            if component_sets.size[root] >= min_nodes:
+                if root not in component_edges:
+                    component_edges[root] = array('q')
+                component_edges[root].append(edge)
+
+        count = 0
+        for root, edge_numbers in component_edges.items():
+            with open(os.path.join(destination_dir, name_format.format(count)), 'w') as f:
+                for edge in self.adjacency_order(edge_numbers, ranks):
+                    f.write('{} {} {}\n'.format(self.sources[edge], self.destinations[edge], self.edge_data(edge)))
+            count += 1
+            print("Dump Complete for Graph: {}, Number of Nodes: {}, Number of Edges: {}".format(count, component_sets.size[root], len(edge_numbers)))
+        return count
+
+    @classmethod
+    def read_edgelist(cls, path):
+        graph = cls()
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                src, dst, data = line.split(' ', 2)
+                data = ast.literal_eval(data)
+                graph.add_edge(src, dst, data.get("src_type", 0), data.get("dst_type", 0), data.get("event_type"),
+                               data.get("time", 0), data.get("id", 0), data.get("attr", NO_ATTR))
+        return graph
@@ -0,0 +1,113 @@
+'''
+This file contains the read-only bitmap of the file nodes, the replacement for the readonly
+column mark_read_only.py maintains in "FileObject". nm_graph_construction.py sets the bit of
+every file node an EVENT_WRITE touches while it builds the graphs and writes the bitmap next
+to them, and summarize.py loads it instead of pulling uuid, readonly for the whole table.
+
+Bit i belongs to node id first_id + i. A file is read only when its bit is clear, which
+includes files no event wrote to, as readonly = 1 does in the database.
+
+The header also holds the identity of the index the node ids come from (a checksum of its
+source, id ranges and Parquet parts, 0 when unknown), so bitmaps are only merged when they
+describe the same ids.
+
+Layout (little endian):
+    header      magic, first id, bit count, index identity
+    bits        (bit count + 7) // 8 bytes, bit i is bit i % 8 of byte i // 8
+'''
+
+import os
+import json
+import zlib
+import struct
+
+BITMAP_MAGIC = b'NMROB002'
+HEADER_FORMAT = '<8sqqq'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+class ReadOnlyBitmap:
+
+    def __init__(self, first_id, bit_count = 0, index_identity = 0):
+        self.first_id = first_id
+        self.bit_count = bit_count
+        self.index_identity = index_identity
+        self.bits = bytearray((bit_count + 7) // 8)
+
+    @classmethod
+    def for_index(cls, index):
+        '''
+        Bitmap sized for the file node id range of a binary index. An index_file.json has no
+        ranges, then the bitmap starts at id 0 and grows with the largest id written to.
+        '''
+        id_ranges = index.metadata.get("id_ranges") if hasattr(index, "metadata") else None
+        if id_ranges is None:
+            return cls(0)
+        file_range = id_ranges["tables"]["FileObject"]
+        return cls(file_range["first"], max(file_range["last"] - file_range["first"] + 1, 0), get_index_identity(index))
+
+    @classmethod
+    def load(cls, bitmap_file_location):
+        with open(bitmap_file_location, 'rb') as f:
+            magic, first_id, bit_count, index_identity = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+            if magic != BITMAP_MAGIC:
+                raise ValueError("{} is not a read-only bitmap".format(bitmap_file_location))
+            bitmap = cls(first_id, bit_count, index_identity)
+            f.readinto(bitmap.bits)
+        return bitmap
+
+    def save(self, bitmap_file_location):
+        with open(bitmap_file_location + '.tmp', 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, BITMAP_MAGIC, self.first_id, self.bit_count, self.index_identity))
+            f.write(self.bits)
+        os.replace(bitmap_file_location + '.tmp', bitmap_file_location)
+
+    def mark_written(self, node_id):
+        position = int(node_id) - self.first_id
+        if position < 0:
+            return
+        if position >= self.bit_count:
+            self.bit_count = position + 1
+            self.bits.extend(bytes((self.bit_count + 7) // 8 - len(self.bits)))
+        self.bits[position >> 3] |= 1 << (position & 7)
+
+    def is_written(self, node_id):
+        position = int(node_id) - self.first_id
+        if position < 0 or position >= self.bit_count:
+            return False
+        return (self.bits[position >> 3] >> (position & 7)) & 1 == 1
+
+    def is_read_only(self, node_id):
+        return not self.is_written(node_id)
+
+    def can_merge(self, other):
+        # Only bitmaps of the same known index describe the same node ids.
+        return self.index_identity != 0 and other.index_identity == self.index_identity and other.first_id == self.first_id
+
+    def merge(self, other):
+        # Adds the written files of another bitmap over the same ids, e.g. the one of an
+        # earlier run over a different time window.
+        if not self.can_merge(other):
+            raise ValueError("Bitmaps of different or unknown indices cannot be merged")
+        if other.bit_count > self.bit_count:
+            self.bit_count = other.bit_count
+            self.bits.extend(bytes(len(other.bits) - len(self.bits)))
+        for position, byte in enumerate(other.bits):
+            if byte:
+                self.bits[position] |= byte
+
+    def written_count(self):
+        return sum([bin(byte).count('1') for byte in self.bits if byte])
+
+
+def get_index_identity(index):
+    # Checksum of the source, the id ranges and the Parquet parts of a binary index, 0 for an index without ranges.
+    metadata = index.metadata if hasattr(index, "metadata") else dict()
+    if "id_ranges" not in metadata:
+        return 0
+    identity = {"source": metadata.get("source"), "id_ranges": metadata["id_ranges"]}
+    if "parquet_parts" in metadata:
+        # The node ids of an index built from Parquet also depend on its part files.
+        identity["parquet_parts"] = metadata["parquet_parts"]
+    identity = json.dumps(identity, sort_keys=True)
+    return zlib.crc32(identity.encode('utf-8')) or 1
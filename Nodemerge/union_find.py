@@ -0,0 +1,75 @@
+'''
+This file contains the union-find (disjoint set forest) the graph builder uses to label the
+weakly connected components while it adds edges, so components are known as soon as the event
+scan ends without a traversal of the finished graph.
+
+parent and size are flat int64 arrays indexed by the node id itself, which suits the compact id
+ranges create_json.py hands out (a few bytes per id, no dict per node). parent[i] == -1 marks
+an id that is not a node of the graph.
+'''
+
+from array import array
+
+
+class UnionFind:
+
+    def __init__(self, capacity = 0):
+        self.parent = array('q', [-1]) * capacity
+        self.size = array('q', [0]) * capacity
+        self.node_count = 0
+
+    def grow(self, node):
+        if node >= len(self.parent):
+            # Doubling keeps the number of copies logarithmic in the largest node id.
+            extra = max(node + 1, 2 * len(self.parent)) - len(self.parent)
+            self.parent.extend(array('q', [-1]) * extra)
+            self.size.extend(array('q', [0]) * extra)
+
+    def add(self, node):
+        node = int(node)
+        self.grow(node)
+        if self.parent[node] == -1:
+            self.parent[node] = node
+            self.size[node] = 1
+            self.node_count += 1
+        return node
+
+    def __contains__(self, node):
+        node = int(node)
+        return 0 <= node < len(self.parent) and self.parent[node] != -1
+
+    def find(self, node):
+        # Root of the set holding node, halving the path on the way up.
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, a, b):
+        root_a = self.find(self.add(a))
+        root_b = self.find(self.add(b))
+        if root_a == root_b:
+            return root_a
+        # The smaller set goes below the larger one.
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+
+    def component_size(self, node):
+        return self.size[self.find(int(node))]
+
+    def components(self, min_size = 1):
+        # root -> node ids in ascending order, for the sets of at least min_size nodes.
+        components = dict()
+        for node in range(len(self.parent)):
+            if self.parent[node] == -1:
+                continue
+            root = self.find(node)
+            if self.size[root] >= min_size:
+                if root not in components:
+                    components[root] = []
+                components[root].append(node)
+        return components
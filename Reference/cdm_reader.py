@@ -0,0 +1,340 @@
+'''
+This file contains the decoding layer that sits between the CDM18 input files and the
+parsing functions in parser_1.py. Every record type is mapped to its parser through a
+table built once at import time, so a line costs one JSON decode and one dict lookup.
+orjson is used for decoding when it is installed, the standard json module otherwise.
+The original CDM18 Avro container files can be read directly when fastavro is installed.
+gzip, bz2 and xz (and zstd with the zstandard package) inputs are decompressed on the fly.
+'''
+
+import io
+import bz2
+import gzip
+import json
+import lzma
+import queue
+import threading
+import uuid
+import parser_1 as ps
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import fastavro
+except ImportError:
+    fastavro = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CDM_NAMESPACE = 'com.bbn.tc.schema.avro.cdm18.'
+
+record_parsers = {
+    CDM_NAMESPACE + 'Subject': ps.parse_subject,
+    CDM_NAMESPACE + 'Event': ps.parse_event,
+    CDM_NAMESPACE + 'FileObject': ps.parse_file_object,
+    CDM_NAMESPACE + 'PacketSocketObject': ps.parse_packet_socket_object,
+    CDM_NAMESPACE + 'RegistryKeyObject': ps.parse_registry_key_object,
+    CDM_NAMESPACE + 'UnnamedPipeObject': ps.parse_unnamed_pipe_object,
+    CDM_NAMESPACE + 'MemoryObject': ps.parse_memory_object,
+    CDM_NAMESPACE + 'NetFlowObject': ps.parse_netflow_object,
+    CDM_NAMESPACE + 'SrcSinkObject': ps.parse_src_sink_object,
+    CDM_NAMESPACE + 'Host': ps.parse_host,
+    CDM_NAMESPACE + 'Principal': ps.parse_principal,
+    CDM_NAMESPACE + 'ProvenanceTagNode': ps.parse_provenance_tag_node
+}
+
+
+def decode_line(line):
+    '''
+    Decodes one CDM18 JSON line (str or bytes) and returns the
+    full record type name together with the record dict.
+    '''
+    (record_type, record), = json_loads(line)['datum'].items()
+    return record_type, record
+
+
+def short_type_name(record_type):
+    return record_type[len(CDM_NAMESPACE):]
+
+
+compression_magics = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd')
+]
+
+
+def detect_compression(data_file_name):
+    with open(data_file_name, 'rb') as f:
+        magic = f.read(6)
+    for compression_magic, compression in compression_magics:
+        if magic.startswith(compression_magic):
+            return compression
+    return None
+
+
+def open_decompressed(data_file_name, compression):
+    if compression == 'gzip':
+        return gzip.open(data_file_name, 'rb')
+    if compression == 'bz2':
+        return bz2.open(data_file_name, 'rb')
+    if compression == 'xz':
+        return lzma.open(data_file_name, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstandard is required to read {}".format(data_file_name))
+        return zstandard.ZstdDecompressor().stream_reader(open(data_file_name, 'rb'), read_across_frames=True, closefd=True)
+    return open(data_file_name, 'rb')
+
+
+class PrefetchReader(io.RawIOBase):
+    '''
+    Read-only raw stream that runs the decompression on a background thread and hands
+    finished chunks over through a bounded queue. zlib, bz2 and lzma release the GIL
+    while they decompress, so this overlaps decompression with JSON parsing.
+    '''
+
+    def __init__(self, source, chunk_size = 4 * 1024 * 1024, depth = 4):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(maxsize=depth)
+        self.current = memoryview(b'')
+        self.position = 0
+        self.eof = False
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._fill, daemon=True)
+        self.thread.start()
+
+    def _put(self, chunk):
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fill(self):
+        try:
+            while not self.stopped.is_set():
+                chunk = self.source.read(self.chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            self.error = e
+            self._put(b'')
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, b):
+        while len(self.current) == 0:
+            if self.eof:
+                return 0
+            chunk = self.chunks.get()
+            if not chunk:
+                self.eof = True
+                if self.error is not None:
+                    raise self.error
+                return 0
+            self.current = memoryview(chunk)
+        n = min(len(b), len(self.current))
+        b[:n] = self.current[:n]
+        self.current = self.current[n:]
+        self.position += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.source.close()
+        super().close()
+
+
+def open_cdm_file(data_file_name, compression = None):
+    '''
+    Opens an input file for binary line reading. Compressed files are decompressed by a
+    PrefetchReader thread; the returned stream is then not seekable and tell() counts
+    decompressed bytes.
+    '''
+    if compression is None:
+        return open(data_file_name, 'rb')
+    return io.BufferedReader(PrefetchReader(open_decompressed(data_file_name, compression)), buffer_size=1024 * 1024)
+
+
+def seek_forward(f, offset):
+    # Compressed streams cannot seek, so they are read forward up to the offset instead.
+    if f.seekable():
+        f.seek(offset)
+        return
+    remaining = offset - f.tell()
+    while remaining > 0:
+        chunk = f.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+
+
+# Avro container files written by the TC tools start with this magic.
+AVRO_MAGIC = b'Obj\x01'
+
+avro_primitive_types = {'null', 'boolean', 'int', 'long', 'float', 'double', 'bytes', 'string'}
+
+
+def is_avro_file(data_file_name, compression = None):
+    with open_decompressed(data_file_name, compression) as f:
+        return f.read(4) == AVRO_MAGIC
+
+
+def get_full_name(name, namespace):
+    if '.' in name or not namespace:
+        return name
+    return namespace + '.' + name
+
+
+def collect_named_schemas(schema, namespace, named):
+    '''
+    Walks an Avro schema and registers every record, enum and fixed type under its full name,
+    so that references by name can be resolved while converting records.
+    '''
+    if isinstance(schema, list):
+        for branch in schema:
+            collect_named_schemas(branch, namespace, named)
+    elif isinstance(schema, dict):
+        schema_type = schema['type']
+        if schema_type in ('record', 'error', 'enum', 'fixed'):
+            full_name = get_full_name(schema['name'], schema.get('namespace', namespace))
+            named[full_name] = schema
+            namespace = full_name.rpartition('.')[0]
+            if schema_type != 'enum' and schema_type != 'fixed':
+                for field in schema['fields']:
+                    collect_named_schemas(field['type'], namespace, named)
+        elif schema_type == 'array':
+            collect_named_schemas(schema['items'], namespace, named)
+        elif schema_type == 'map':
+            collect_named_schemas(schema['values'], namespace, named)
+    return named
+
+
+def resolve_schema(schema, named, namespace):
+    # Returns (schema, full name or primitive name) for a possibly named schema reference.
+    if isinstance(schema, str):
+        if schema in avro_primitive_types:
+            return schema, schema
+        full_name = get_full_name(schema, namespace)
+        return named[full_name], full_name
+    if isinstance(schema, dict):
+        if schema['type'] in ('record', 'error', 'enum', 'fixed'):
+            return schema, get_full_name(schema['name'], schema.get('namespace', namespace))
+        if schema['type'] in avro_primitive_types:
+            return schema['type'], schema['type']
+        return schema, schema['type']
+    return schema, 'union'
+
+
+def union_branch_matches(value, schema, schema_name):
+    if schema_name in ('int', 'long'):
+        return isinstance(value, int) and not isinstance(value, bool)
+    if schema_name in ('float', 'double'):
+        return isinstance(value, float)
+    if schema_name == 'string':
+        return isinstance(value, str)
+    if schema_name == 'boolean':
+        return isinstance(value, bool)
+    if schema_name == 'bytes':
+        return isinstance(value, bytes)
+    if isinstance(schema, dict):
+        if schema['type'] == 'fixed':
+            return isinstance(value, bytes) and len(value) == schema['size']
+        if schema['type'] == 'enum':
+            return isinstance(value, str) and value in schema['symbols']
+        if schema['type'] in ('record', 'error', 'map'):
+            return isinstance(value, dict)
+        if schema['type'] == 'array':
+            return isinstance(value, list)
+    return False
+
+
+def to_json_encoding(value, schema, named, namespace = ''):
+    '''
+    Converts a value decoded by fastavro into the Avro JSON encoding used by the extracted_json
+    files: non-null union values are wrapped as {branch name: value}, UUIDs become the usual
+    dashed upper case strings and other fixed types (SHORT, BYTE) become hex strings.
+    '''
+    if value is None:
+        return None
+    if isinstance(schema, list):
+        if isinstance(value, tuple):
+            # Union of records read with return_record_name=True
+            branch_name, value = value
+            branch_schema, branch_name = resolve_schema(branch_name, named, namespace)
+            return {branch_name: to_json_encoding(value, branch_schema, named, namespace)}
+        for branch in schema:
+            branch_schema, branch_name = resolve_schema(branch, named, namespace)
+            if branch_name != 'null' and union_branch_matches(value, branch_schema, branch_name):
+                return {branch_name: to_json_encoding(value, branch_schema, named, namespace)}
+        raise ValueError("Value {!r} does not match any branch of {}".format(value, schema))
+
+    schema, schema_name = resolve_schema(schema, named, namespace)
+    if isinstance(schema, str):
+        return value
+
+    schema_type = schema['type']
+    if schema_type in ('record', 'error'):
+        record_namespace = schema_name.rpartition('.')[0]
+        return {field['name']: to_json_encoding(value.get(field['name']), field['type'], named, record_namespace)
+                for field in schema['fields']}
+    if schema_type == 'fixed':
+        if schema_name.rpartition('.')[2] == 'UUID':
+            return str(uuid.UUID(bytes=value)).upper()
+        return value.hex().upper()
+    if schema_type == 'array':
+        return [to_json_encoding(item, schema['items'], named, namespace) for item in value]
+    if schema_type == 'map':
+        return {key: to_json_encoding(item, schema['values'], named, namespace) for key, item in value.items()}
+    return value
+
+
+def open_avro_source(f, resume_offset = None):
+    '''
+    Opens a CDM18 Avro container file and returns (datums, decode). datums yields
+    (records consumed so far, raw datum) and decode turns a raw datum into the same
+    (record type, record dict) pair decode_line returns for a JSON line, so the
+    parse_* functions see identical input. For Avro files the resume offset is the
+    number of records already consumed, since the container cannot be entered mid-block.
+    '''
+    if fastavro is None:
+        raise ImportError("fastavro is required to read Avro CDM files directly")
+
+    avro_reader = fastavro.reader(f, return_record_name=True)
+    writer_schema = avro_reader.writer_schema
+    named = collect_named_schemas(writer_schema, '', dict())
+
+    def datums():
+        skip = resume_offset if resume_offset is not None else 0
+        consumed = 0
+        for datum in avro_reader:
+            consumed += 1
+            if consumed <= skip:
+                continue
+            yield consumed, datum
+
+    def decode(datum):
+        record_type, record = datum['datum']
+        record_schema = named[record_type]
+        return record_type, to_json_encoding(record, record_schema, named, record_type.rpartition('.')[0])
+
+    return datums(), decode
@@ -0,0 +1,54 @@
+'''
+This file contains the lightweight record types the parsing functions produce. Every CDM
+table gets a namedtuple whose fields are the table's columns (without the serial id) in
+the order they are declared in db_classes.py. The ORM classes are only used for schema
+definition; the bulk loaders consume these tuples directly.
+'''
+
+from collections import namedtuple
+import db_classes as orm
+
+
+def make_record_type(orm_class):
+    columns = [column.name for column in orm_class.__table__.columns if column.name != 'id']
+    return namedtuple(orm_class.__name__ + 'Record', columns)
+
+
+Subject = make_record_type(orm.Subject)
+Event = make_record_type(orm.Event)
+FileObject = make_record_type(orm.FileObject)
+UnnamedPipeObject = make_record_type(orm.UnnamedPipeObject)
+MemoryObject = make_record_type(orm.MemoryObject)
+NetFlowObject = make_record_type(orm.NetFlowObject)
+SrcSinkObject = make_record_type(orm.SrcSinkObject)
+PacketSocketObject = make_record_type(orm.PacketSocketObject)
+Host = make_record_type(orm.Host)
+Principal = make_record_type(orm.Principal)
+ProvenanceTagNode = make_record_type(orm.ProvenanceTagNode)
+RegistryKeyObject = make_record_type(orm.RegistryKeyObject)
+
+# Record type -> ORM class holding the table definition.
+record_tables = {
+    Host: orm.Host,
+    Principal: orm.Principal,
+    Subject: orm.Subject,
+    FileObject: orm.FileObject,
+    UnnamedPipeObject: orm.UnnamedPipeObject,
+    MemoryObject: orm.MemoryObject,
+    NetFlowObject: orm.NetFlowObject,
+    SrcSinkObject: orm.SrcSinkObject,
+    PacketSocketObject: orm.PacketSocketObject,
+    RegistryKeyObject: orm.RegistryKeyObject,
+    ProvenanceTagNode: orm.ProvenanceTagNode,
+    Event: orm.Event
+}
+
+
+def group_records(records):
+    '''
+    Splits a mixed batch into {record type: [records]} keeping the order of record_tables.
+    '''
+    grouped_records = dict()
+    for record in records:
+        grouped_records.setdefault(type(record), []).append(record)
+    return {record_type: grouped_records[record_type] for record_type in record_tables if record_type in grouped_records}
@@ -0,0 +1,75 @@
+'''
+This file contains the COPY based loader for the CDM tables. Instead of pushing
+every parsed record through the ORM as an INSERT, the records of each table are
+serialized to CSV in memory and streamed to PostgreSQL with COPY FROM STDIN.
+It works with both the pg8000 and the psycopg2 drivers.
+'''
+
+import io
+import db_classes as orm
+import cdm_records as rec
+from sqlalchemy import create_engine
+
+def format_copy_value(value):
+    # In CSV mode an unquoted empty field is NULL and a quoted one is an empty string.
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def records_to_csv(records):
+    # The record fields are the table columns in order, so the tuples are written as they are.
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write(','.join([format_copy_value(value) for value in record]))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+def copy_into_table(dbapi_connection, table_name, columns, csv_buffer):
+    statement = 'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        table_name, ', '.join(['"{}"'.format(column) for column in columns]))
+    cursor = dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(statement, csv_buffer)
+        else:
+            # pg8000
+            cursor.execute(statement, stream=csv_buffer)
+    finally:
+        cursor.close()
+
+
+def copy_records(dbapi_connection, records, batch_size = 100000):
+    '''
+    Groups the records by table (with Event last) and COPYs each group in slices
+    of batch_size. The caller owns the transaction and has to commit afterwards.
+    '''
+    copied = 0
+    for record_type, table_records in rec.group_records(records).items():
+        table_name = rec.record_tables[record_type].__tablename__
+        columns = list(record_type._fields)
+        for start_idx in range(0, len(table_records), batch_size):
+            csv_buffer = records_to_csv(table_records[start_idx:start_idx+batch_size])
+            copy_into_table(dbapi_connection, table_name, columns, csv_buffer)
+        copied += len(table_records)
+    return copied
+
+
+def copy_dump_in_db(records, connection_string, batch_size = 100000):
+    '''
+    COPY counterpart of data_dumping.bulk_dump_in_db.
+    '''
+    psql_engine = create_engine(connection_string)
+    orm.BASE.metadata.create_all(psql_engine)
+    dbapi_connection = psql_engine.raw_connection()
+    try:
+        copied = copy_records(dbapi_connection, records, batch_size=batch_size)
+        dbapi_connection.commit()
+        print("COPY complete for {} records".format(copied))
+    finally:
+        dbapi_connection.close()
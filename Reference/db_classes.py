@@ -321,3 +321,21 @@ class RegistryKeyObject(BASE):
         return 'RegistryKeyObject(uuid={}, base_object_host_id={}, base_object_permission={}, key={})'.format(self.uuid, self.base_object_host_id, self.base_object_permission, self.key)
 
 
+
+class IngestCheckpoint(BASE): # Written by data_dumping.py in the transaction of every batch it commits
+    __tablename__ = 'IngestCheckpoint'
+    __table_args__ = {'extend_existing': True}
+
+    file = Column(String(1024), primary_key=True)
+    start = Column(BigInteger, primary_key=True)
+    offset = Column(BigInteger)
+    done = Column(Integer)
+
+    def __init__(self, file, start, offset, done):
+        self.file = file
+        self.start = start
+        self.offset = offset
+        self.done = done
+
+    def __str__(self):
+        return 'IngestCheckpoint(file={}, start={}, offset={}, done={})'.format(self.file, self.start, self.offset, self.done)
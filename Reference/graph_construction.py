@@ -1,4 +1,5 @@
 import os 
+import sys
 import json
 from re import sub
 from tkinter.messagebox import NO 
@@ -6,11 +7,15 @@ import db_classes as orm
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import psycopg2
+# The index reader lives with the other Nodemerge tools.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Nodemerge'))
+import node_index as ni
 
 
 graph = dict() # The graph object to hold the provenance graph
 index = dict() # The index mapping for quick retrieval of objects
 
+# Either a binary index (Nodemerge/create_json.py) or the old index_file.json.
 index_file_location = '/mnt/8tb/csenrc/representation_learning_codes/index_file.json'
 graph_file_location = '/mnt/8tb/csenrc/representation_learning_codes/graph_file.json'
 
@@ -115,6 +120,11 @@ name_types = {
             }
 
 
+def get_type(uuid):
+    # The binary index returns [type, id, table], the old index file maps uuid -> type.
+    entry = index[uuid]
+    return entry[0] if isinstance(entry, list) else entry
+
 def get_node(session, uuid, table_code):
     table = mapping_dict[table_code]
     if table == "EVENT":
@@ -175,7 +185,7 @@ def process_events(session, event_list):
             # Now, predicate object 1
             encoded_predicate_obj1 = None
             if predicate_uuid_1 is not None:
-                temp_type = index[predicate_uuid_1]
+                temp_type = get_type(predicate_uuid_1)
                 if temp_type == mapping_dict["FILE"]:
                     file_obj = get_node(session,predicate_uuid_1, temp_type)
                     encoded_predicate_obj1 = encode_file_object(file_obj, event.prediacte_object_path)
@@ -186,7 +196,7 @@ def process_events(session, event_list):
             #Now, predicate object 2
             encoded_predicate_obj2 = None
             if predicate_uuid_2 is not None:
-                temp_type = index[predicate_uuid_2]
+                temp_type = get_type(predicate_uuid_2)
                 if temp_type == mapping_dict["FILE"]:
                     file_obj = get_node(session,predicate_uuid_2, temp_type)
                     encoded_predicate_obj2 = encode_file_object(file_obj, event.predicate_object_path_2)
@@ -239,11 +249,11 @@ def encode_event(event_object):
     #Feature 2: Predicate object type of this event
     predicate_type = 0
     if event_object.predicate_object is not None:
-        predicate_type = index[event_object.predicate_object]/12 # This is where we are finding out the predicate object type and then dividing it by number of possible objects which is 12
+        predicate_type = get_type(event_object.predicate_object)/12 # This is where we are finding out the predicate object type and then dividing it by number of possible objects which is 12
     # Feature 3: Predicate object 2 type of this event
     predicate_type2 = 0
     if event_object.predicate_object_2 is not None:
-        predicate_type2 = index[event_object.predicate_object_2]/12 # Same as before
+        predicate_type2 = get_type(event_object.predicate_object_2)/12 # Same as before
     # Feature 4: Event time stamp. This will be used to calculate the time delta. 
     time_stamp = 0
     if event_object.time_stamp_nanos is not None:
@@ -313,10 +323,7 @@ if __name__ == "__main__":
     batch_size = 500000
     event_list = []
 
-    with open(index_file_location,'r') as index_file:
-        index = json.load(index_file)
-
-    index_file.close()
+    index = ni.load_index(index_file_location)
 
     print("INDEX LOADED.")
 
@@ -0,0 +1,97 @@
+'''
+This file contains the Parquet sink for the ingest. Instead of inserting into PostgreSQL,
+every flush of parsed records is written as one Parquet part file per table under
+<output_dir>/<table>/, and Event rows are further partitioned by the UTC day of their
+time_stamp_nanos into <output_dir>/Event/day=YYYY-MM-DD/. The column names and types
+follow db_classes.py. Nodemerge/parquet_store.py reads the dataset back.
+'''
+
+import os
+from datetime import datetime, timezone
+import cdm_records as rec
+from sqlalchemy import BigInteger, Integer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Partition for events without a timestamp.
+UNKNOWN_DAY = 'unknown'
+
+
+def get_arrow_schema(orm_class):
+    fields = []
+    for column in orm_class.__table__.columns:
+        if column.name == 'id':
+            continue
+        # BigInteger is a subclass of Integer, so it has to be checked first.
+        if isinstance(column.type, BigInteger):
+            fields.append(pa.field(column.name, pa.int64()))
+        elif isinstance(column.type, Integer):
+            fields.append(pa.field(column.name, pa.int32()))
+        else:
+            fields.append(pa.field(column.name, pa.string()))
+    return pa.schema(fields)
+
+
+def event_day(time_stamp_nanos):
+    if time_stamp_nanos is None:
+        return UNKNOWN_DAY
+    return datetime.fromtimestamp(time_stamp_nanos // 1000000000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def records_to_table(records, schema):
+    # Values are coerced to the column type the same way PostgreSQL would on INSERT.
+    arrays = []
+    for field, values in zip(schema, zip(*records)):
+        if pa.types.is_integer(field.type):
+            values = [int(value) if value is not None else None for value in values]
+        else:
+            values = [str(value) if value is not None else None for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ParquetSink:
+    '''
+    Writes batches of parsed records as Parquet part files. The caller names every batch;
+    writing the same part name again replaces the earlier file, so a batch replayed after
+    a crash does not duplicate rows.
+    '''
+
+    def __init__(self, output_dir, compression = 'zstd'):
+        if pa is None:
+            raise ImportError("pyarrow is required for the parquet loader")
+        self.output_dir = output_dir
+        self.compression = compression
+        self.schemas = {record_type: get_arrow_schema(orm_class) for record_type, orm_class in rec.record_tables.items()}
+
+    def write(self, records, part_name):
+        written = 0
+        for record_type, table_records in rec.group_records(records).items():
+            table_dir = os.path.join(self.output_dir, rec.record_tables[record_type].__tablename__)
+            if record_type is rec.Event:
+                day_records = dict()
+                for record in table_records:
+                    day_records.setdefault(event_day(record.time_stamp_nanos), []).append(record)
+                for day in sorted(day_records):
+                    self.write_part(os.path.join(table_dir, 'day=' + day), part_name, record_type, day_records[day])
+            else:
+                self.write_part(table_dir, part_name, record_type, table_records)
+            written += len(table_records)
+        return written
+
+    def write_part(self, directory, part_name, record_type, records):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, part_name + '.parquet')
+        temp_path = path + '.tmp'
+        pq.write_table(records_to_table(records, self.schemas[record_type]), temp_path, compression=self.compression)
+        # Renamed into place only once complete, so a crash never leaves a torn part file behind.
+        os.replace(temp_path, path)
+
+    def close(self):
+        # Nothing is held open between batches.
+        pass
@@ -1,15 +1,15 @@
 '''
 This file conatins all the data parsing functions. The name of the functions are self explanatory. 
 The functions will take a JSON formatted object as input and will parse 
-the data and populate an corrsponding ORM mapped object to dump in DB. 
+the data and populate the corresponding lightweight record (see cdm_records.py) to dump in DB. 
 '''
 
-import db_classes as orm
+import cdm_records as rec
 
 def parse_subject(json_subject):
     '''
     This function will parse the JSON object 
-    and populate the Subject ORM object.
+    and populate the Subject record.
     '''
     uuid = json_subject['uuid']
     type = json_subject['type']
@@ -51,7 +51,7 @@ def parse_subject(json_subject):
     if json_subject['exportedLibraries'] is not None:
         exported_libraries = json_subject['exportedLibraries'].tostring()
 
-    subject = orm.Subject(uuid, type, cid, parent_subject, host_id, local_prinicpal, 
+    subject = rec.Subject(uuid, type, cid, parent_subject, host_id, local_prinicpal, 
     start_time_stamp_nanos, unit_id, iteration, count, cmd_line, privilege_level, imported_libraries, exported_libraries)
 
     return subject
@@ -60,7 +60,7 @@ def parse_subject(json_subject):
 def parse_event(json_event):
     '''
     This function will parse the JSON object 
-    and populate the Event ORM object.
+    and populate the Event record.
     '''
     uuid = json_event['uuid']
     sequence = None
@@ -110,14 +110,14 @@ def parse_event(json_event):
     if json_event['programPoint'] is not None:
         program_point = json_event['programPoint']['string']
     
-    event = orm.Event(uuid, sequence, type, thread_id, host_id, subject, predicate_object, predicate_object_path, predicate_object_2, predicate_object2_path, time_stamp_nanos, name, location, size, program_point)
+    event = rec.Event(uuid, sequence, type, thread_id, host_id, subject, predicate_object, predicate_object_path, predicate_object_2, predicate_object2_path, time_stamp_nanos, name, location, size, program_point)
 
     return event
 
 def parse_file_object(json_file_object):
     '''
     This function will parse the JSON object 
-    and populate the File ORM object.
+    and populate the File record.
     '''
     uuid = json_file_object['uuid']
 
@@ -144,7 +144,8 @@ def parse_file_object(json_file_object):
     if json_file_object['size'] is not None:
         size = json_file_object['size']['long']
 
-    file_object = orm.FileObject(uuid, base_object_host_id, condition(base_object_permission) , type, file_descriptor, local_principal, size)
+    # Every file starts out as read only, mark_read_only.py clears the flag for written files.
+    file_object = rec.FileObject(uuid, base_object_host_id, condition(base_object_permission) , type, file_descriptor, local_principal, size, 1)
 
     return file_object
 
@@ -152,7 +153,7 @@ def parse_file_object(json_file_object):
 def parse_unnamed_pipe_object(json_unnamed_pipe_object):
     '''
     This function will parse the JSON object 
-    and populate the UnnamedPipeObject ORM object.
+    and populate the UnnamedPipeObject record.
     '''
     uuid = json_unnamed_pipe_object['uuid']
     condition = lambda x: int(x, base=16) if x is not None else None
@@ -179,7 +180,7 @@ def parse_unnamed_pipe_object(json_unnamed_pipe_object):
     if json_unnamed_pipe_object['sinkUUID'] is not None:
         sink_uuid = json_unnamed_pipe_object['sinkUUID']['com.bbn.tc.schema.avro.cdm18.UUID']
 
-    unnamed_pipe_object = orm.UnnamedPipeObject(uuid, base_object_host_id, condition(base_object_permission), source_file_descriptor, sink_file_descriptor, source_uuid, sink_uuid)
+    unnamed_pipe_object = rec.UnnamedPipeObject(uuid, base_object_host_id, condition(base_object_permission), source_file_descriptor, sink_file_descriptor, source_uuid, sink_uuid)
 
     return unnamed_pipe_object
 
@@ -187,7 +188,7 @@ def parse_unnamed_pipe_object(json_unnamed_pipe_object):
 def parse_registry_key_object(json_registry_key_object):
     '''
     This function will parse the JSON object 
-    and populate the RegistryKeyObject ORM object.
+    and populate the RegistryKeyObject record.
     '''
     uuid = json_registry_key_object['uuid']
     condition = lambda x: int(x, base=16) if x is not None else None
@@ -201,14 +202,14 @@ def parse_registry_key_object(json_registry_key_object):
 
     key = json_registry_key_object['key']
 
-    registry_key_object = orm.RegistryKeyObject(uuid, base_object_host_id, condition(base_object_permission), key)
+    registry_key_object = rec.RegistryKeyObject(uuid, base_object_host_id, condition(base_object_permission), key)
 
     return registry_key_object
 
 def parse_memory_object(json_memory_object):
     '''
     This function will parse the JSON object 
-    and populate the MemoryObject ORM object.
+    and populate the MemoryObject record.
     '''
     uuid = json_memory_object['uuid']
     condition = lambda x: int(x, base=16) if x is not None else None
@@ -231,14 +232,14 @@ def parse_memory_object(json_memory_object):
     if json_memory_object['size'] is not None:
         size = json_memory_object['size']['long']
     
-    memory_object = orm.MemoryObject(uuid, base_object_host_id, condition(base_object_permission), memory_address, page_number, page_offset, size)
+    memory_object = rec.MemoryObject(uuid, base_object_host_id, condition(base_object_permission), memory_address, page_number, page_offset, size)
 
     return memory_object
 
 def parse_netflow_object(json_net_flow_object):
     '''
     This function will parse the JSON object 
-    and populate the NetFlowObject ORM object.
+    and populate the NetFlowObject record.
     '''
     uuid = json_net_flow_object['uuid']
     condition = lambda x: int(x, base=16) if x is not None else None
@@ -262,14 +263,14 @@ def parse_netflow_object(json_net_flow_object):
     if json_net_flow_object['fileDescriptor'] is not None:
         file_descriptor = json_net_flow_object['fileDescriptor']['int']
     
-    net_flow_object = orm.NetFlowObject(uuid, base_object_host_id, condition(base_object_permission), local_address, local_port, remote_address, remote_port, ip_protocol, file_descriptor)
+    net_flow_object = rec.NetFlowObject(uuid, base_object_host_id, condition(base_object_permission), local_address, local_port, remote_address, remote_port, ip_protocol, file_descriptor)
 
     return net_flow_object
 
 def parse_src_sink_object(json_src_sink_object):
     '''
     This function will parse the JSON object 
-    and populate the SrcSinkObject ORM object.
+    and populate the SrcSinkObject record.
     '''
     uuid = json_src_sink_object['uuid']
     condition = lambda x: int(x, base=16) if x is not None else None
@@ -286,14 +287,14 @@ def parse_src_sink_object(json_src_sink_object):
     if json_src_sink_object['fileDescriptor'] is not None:
         file_descriptor = json_src_sink_object['fileDescriptor']['int']
 
-    src_sink_object = orm.SrcSinkObject(uuid, base_object_host_id, condition(base_object_permission), type, file_descriptor)
+    src_sink_object = rec.SrcSinkObject(uuid, base_object_host_id, condition(base_object_permission), type, file_descriptor)
 
     return src_sink_object
 
 def parse_packet_socket_object(json_packet_socket_object):
     '''
     This function will parse the JSON object 
-    and populate the PacketSocketObject ORM object.
+    and populate the PacketSocketObject record.
     '''
     uuid = json_packet_socket_object['uuid']
     condition = lambda x: int(x, base=16) if x is not None else None
@@ -311,21 +312,21 @@ def parse_packet_socket_object(json_packet_socket_object):
     pkt_type = json_packet_socket_object['pktType']
     addr = json_packet_socket_object['addr']
 
-    packet_socket_object = orm.PacketSocketObject(uuid, base_object_host_id, condition(base_object_permission), proto, if_index, ha_type, pkt_type, addr)
+    packet_socket_object = rec.PacketSocketObject(uuid, base_object_host_id, condition(base_object_permission), proto, if_index, ha_type, pkt_type, addr)
 
     return packet_socket_object
 
 def parse_host(json_host_object):
     '''
     This function will parse the JSON object 
-    and populate the HostObject ORM object.
+    and populate the HostObject record.
     '''
     uuid = json_host_object['uuid']
     host_name = json_host_object['hostName']
     os_details = json_host_object['osDetails']
     host_type = json_host_object['hostType']
 
-    host_object = orm.Host(uuid, host_name, os_details, host_type)
+    host_object = rec.Host(uuid, host_name, os_details, host_type)
 
     return host_object
 
@@ -333,7 +334,7 @@ def parse_host(json_host_object):
 def parse_principal(json_principal_object):
     '''
     This function will parse the JSON object 
-    and populate the Principal ORM object.
+    and populate the Principal record.
     '''
     uuid = json_principal_object['uuid']
     type = json_principal_object['type']
@@ -344,7 +345,7 @@ def parse_principal(json_principal_object):
         username = json_principal_object['username']['string']
     
     
-    principal_object = orm.Principal(uuid, type, host_id, user_id, username)
+    principal_object = rec.Principal(uuid, type, host_id, user_id, username)
 
     return principal_object
 
@@ -352,7 +353,7 @@ def parse_principal(json_principal_object):
 def parse_provenance_tag_node(json_provenance_tag_node_object):
     '''
     This function will parse the JSON object 
-    and populate the ProvenanceTagNode ORM object.
+    and populate the ProvenanceTagNode record.
     '''
     tag_id = json_provenance_tag_node_object['tagId']
     flow_object = json_provenance_tag_node_object['flowObject']
@@ -361,6 +362,6 @@ def parse_provenance_tag_node(json_provenance_tag_node_object):
     system_call = json_provenance_tag_node_object['systemCall']
     program_point =   json_provenance_tag_node_object['programPoint']
     
-    provenance_tag_node_object = orm.ProvenanceTagNode(tag_id, flow_object, host_id, subject, system_call, program_point)
+    provenance_tag_node_object = rec.ProvenanceTagNode(tag_id, flow_object, host_id, subject, system_call, program_point)
 
     return provenance_tag_node_object
\ No newline at end of file